@@ -0,0 +1,202 @@
+import math
+import numpy as np
+from classes import *
+
+
+def norm_cdf(x):
+    """
+    Cumulative distribution function of the standard normal distribution, accurate to double precision
+    Uses the rational approximations of Hart (1968) as given by West, "Better approximations to cumulative normal
+    functions" (2005), so that it works on numpy arrays without scipy
+    :param x: Number or array
+    :return: Array of probabilities
+    """
+    x = np.asarray(x, dtype=float)
+    x_abs = np.abs(x)
+    # Infinite inputs give nan in the intermediate values, they are replaced by the last np.where
+    with np.errstate(over="ignore", invalid="ignore"):
+        exponential = np.exp(-0.5 * x_abs * x_abs)
+
+        # Close to the center
+        numerator = 3.52624965998911e-02 * x_abs + 0.700383064443688
+        numerator = numerator * x_abs + 6.37396220353165
+        numerator = numerator * x_abs + 33.912866078383
+        numerator = numerator * x_abs + 112.079291497871
+        numerator = numerator * x_abs + 221.213596169931
+        numerator = numerator * x_abs + 220.206867912376
+        denominator = 8.83883476483184e-02 * x_abs + 1.75566716318264
+        denominator = denominator * x_abs + 16.064177579207
+        denominator = denominator * x_abs + 86.7807322029461
+        denominator = denominator * x_abs + 296.564248779674
+        denominator = denominator * x_abs + 637.333633378831
+        denominator = denominator * x_abs + 793.826512519948
+        denominator = denominator * x_abs + 440.413735824752
+        center = exponential * numerator / denominator
+
+        # In the tails, continued fraction
+        fraction = x_abs + 0.65
+        fraction = x_abs + 4 / fraction
+        fraction = x_abs + 3 / fraction
+        fraction = x_abs + 2 / fraction
+        fraction = x_abs + 1 / fraction
+        tail = exponential / fraction / 2.506628274631
+
+    lower = np.where(x_abs < 7.07106781186547, center, tail)
+    lower = np.where(x_abs > 37, 0.0, lower)
+    return np.where(x > 0, 1 - lower, lower)
+
+
+def norm_pdf(x):
+    """
+    :param x: Number or array
+    :return: Density of the standard normal distribution
+    """
+    x = np.asarray(x, dtype=float)
+    return np.exp(-0.5 * x * x) / math.sqrt(2 * math.pi)
+
+
+def black_scholes(spot, strike, T, rf, sigma, is_put=False):
+    """
+    Black-Scholes price of european calls and puts, every parameter can be an array
+    :param spot: Price of the underlying asset
+    :param strike: Strike price
+    :param T: Time to maturity in years
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param is_put: True for puts, False for calls
+    :return: Array of prices
+    """
+    spot, strike, T, sigma = [np.asarray(x, dtype=float) for x in (spot, strike, T, sigma)]
+    vol = sigma * np.sqrt(T)
+    discounted_strike = strike * np.exp(-rf * T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rf + 0.5 * sigma * sigma) * T) / vol
+    d2 = d1 - vol
+    call = spot * norm_cdf(d1) - discounted_strike * norm_cdf(d2)
+    # Without volatility or time the option is worth its discounted intrinsic value
+    call = np.where(vol > 0, call, np.maximum(spot - discounted_strike, 0))
+    # Put-call parity
+    return np.where(is_put, call - spot + discounted_strike, call)
+
+
+def black_scholes_vega(spot, strike, T, rf, sigma):
+    """
+    Derivative of the Black-Scholes price with respect to the volatility, the same for calls and puts
+    :return: Array of vegas
+    """
+    spot, strike, T, sigma = [np.asarray(x, dtype=float) for x in (spot, strike, T, sigma)]
+    vol = sigma * np.sqrt(T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rf + 0.5 * sigma * sigma) * T) / vol
+        vega = spot * norm_pdf(d1) * np.sqrt(T)
+    return np.where(vol > 0, vega, 0.0)
+
+
+# Coefficients of the terms A, B, C, D of the Reiner-Rubinstein formulas for each barrier type, indexed by
+# [is_in, is_down, is_put, strike > barrier] (Haug, The Complete Guide to Option Pricing Formulas, 4.17.1)
+BARRIER_COEFFICIENTS = np.zeros((2, 2, 2, 2, 4))
+BARRIER_COEFFICIENTS[0, 0, 0] = [[1, -1, 1, -1], [0, 0, 0, 0]]     # Up and out call
+BARRIER_COEFFICIENTS[0, 0, 1] = [[1, 0, -1, 0], [0, 1, 0, -1]]     # Up and out put
+BARRIER_COEFFICIENTS[0, 1, 0] = [[0, 1, 0, -1], [1, 0, -1, 0]]     # Down and out call
+BARRIER_COEFFICIENTS[0, 1, 1] = [[0, 0, 0, 0], [1, -1, 1, -1]]     # Down and out put
+BARRIER_COEFFICIENTS[1, 0, 0] = [[0, 1, -1, 1], [1, 0, 0, 0]]      # Up and in call
+BARRIER_COEFFICIENTS[1, 0, 1] = [[0, 0, 1, 0], [1, -1, 0, 1]]      # Up and in put
+BARRIER_COEFFICIENTS[1, 1, 0] = [[1, -1, 0, 1], [0, 0, 1, 0]]      # Down and in call
+BARRIER_COEFFICIENTS[1, 1, 1] = [[1, 0, 0, 0], [0, 1, -1, 1]]      # Down and in put
+
+# Barrier classes: (is_in, is_down)
+BARRIER_TYPES = {UpAndInCall: (True, False), UpAndOutCall: (False, False), DownAndInCall: (True, True),
+                 DownAndOutCall: (False, True), UpAndInPut: (True, False), UpAndOutPut: (False, False),
+                 DownAndInPut: (True, True), DownAndOutPut: (False, True)}
+
+
+def barrier_price(spot, strike, barrier, T, rf, sigma, is_put, is_down, is_in):
+    """
+    Reiner-Rubinstein price of european barrier options with a barrier monitored continuously and no rebate
+    Every parameter can be an array, the barrier should not have been crossed yet: spot above a down barrier and below
+    an up barrier
+    :param spot: Price of the underlying asset
+    :param strike: Strike price
+    :param barrier: Barrier price
+    :param T: Time to maturity in years
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param is_put: True for puts, False for calls
+    :param is_down: True for down barriers, False for up barriers
+    :param is_in: True for knock in options, False for knock out options
+    :return: Array of prices
+    """
+    spot, strike, barrier, T, sigma = [np.asarray(x, dtype=float) for x in (spot, strike, barrier, T, sigma)]
+    is_put, is_down, is_in = [np.asarray(x, dtype=bool) for x in (is_put, is_down, is_in)]
+    phi = np.where(is_put, -1.0, 1.0)
+    eta = np.where(is_down, 1.0, -1.0)
+    vol = sigma * np.sqrt(T)
+    mu = (rf - 0.5 * sigma * sigma) / (sigma * sigma)
+    discounted_strike = strike * np.exp(-rf * T)
+    ratio = barrier / spot
+
+    x1 = np.log(spot / strike) / vol + (1 + mu) * vol
+    x2 = np.log(spot / barrier) / vol + (1 + mu) * vol
+    y1 = np.log(barrier * barrier / (spot * strike)) / vol + (1 + mu) * vol
+    y2 = np.log(barrier / spot) / vol + (1 + mu) * vol
+    A = phi * spot * norm_cdf(phi * x1) - phi * discounted_strike * norm_cdf(phi * (x1 - vol))
+    B = phi * spot * norm_cdf(phi * x2) - phi * discounted_strike * norm_cdf(phi * (x2 - vol))
+    C = phi * spot * ratio ** (2 * (mu + 1)) * norm_cdf(eta * y1) \
+        - phi * discounted_strike * ratio ** (2 * mu) * norm_cdf(eta * (y1 - vol))
+    D = phi * spot * ratio ** (2 * (mu + 1)) * norm_cdf(eta * y2) \
+        - phi * discounted_strike * ratio ** (2 * mu) * norm_cdf(eta * (y2 - vol))
+
+    coefficients = BARRIER_COEFFICIENTS[is_in.astype(int), is_down.astype(int), is_put.astype(int),
+                                        (strike > barrier).astype(int)]
+    terms = np.stack(np.broadcast_arrays(A, B, C, D), axis=-1)
+    return np.maximum((coefficients * terms).sum(axis=-1), 0)
+
+
+def has_closed_form(option):
+    """
+    :param option: An option
+    :return: True if the option can be priced by analytic_prices
+    """
+    return type(option) in BARRIER_TYPES or type(option) in (CallOption, PutOption)
+
+
+def analytic_prices(options, rf, sigma, T=None):
+    """
+    Prices a list of calls, puts and barrier options with closed formulas, all the options being priced at once
+    The price history of the asset is taken into account: a knocked in option is priced as a call or a put and a
+    knocked out option is worth 0
+    :param options: List of options having a closed form
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility, either one value or one value per option
+    :param T: Optional times to maturity in years, by default the maturity in days of each option is used
+    :return: Array of prices, in the order of options
+    """
+    options = list(options)
+    for option in options:
+        if not has_closed_form(option):
+            raise ValueError("There is no closed form for the option {}".format(type(option).__name__))
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=float), (len(options),))
+    if T is None:
+        T = [option.days / 365 for option in options]
+    T = np.broadcast_to(np.asarray(T, dtype=float), (len(options),))
+    spot = np.array([option.asset.actual_price for option in options], dtype=float)
+    strike = np.array([option.strike for option in options], dtype=float)
+    is_put = np.array([isinstance(option, PutOption) for option in options], dtype=bool)
+    prices = black_scholes(spot, strike, T, rf, sigma, is_put)
+
+    # Barrier options that are still alive and not knocked in yet, selected with masks so the cost stays linear
+    flags = np.array([BARRIER_TYPES.get(type(option), (False, False)) for option in options], dtype=bool).reshape(-1, 2)
+    is_barrier = np.array([type(option) in BARRIER_TYPES for option in options], dtype=bool)
+    active = np.array([is_barrier[index] and option.active for index, option in enumerate(options)], dtype=bool)
+    is_in = flags[:, 0]
+    # Knocked out options are worth 0, knocked in options are calls or puts now
+    prices[is_barrier & ~active & ~is_in] = 0
+    pending = np.flatnonzero(is_barrier & (active != is_in))
+    if len(pending):
+        barrier = np.array([options[index].barrier for index in pending], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            barrier_prices = barrier_price(spot[pending], strike[pending], barrier, T[pending], rf, sigma[pending],
+                                           is_put[pending], flags[pending, 1], flags[pending, 0])
+        # At maturity the option is worth its payoff
+        prices[pending] = np.where(T[pending] > 0, barrier_prices, [options[index].payoff() for index in pending])
+    return prices
@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+from classes import *
+from analytic import *
+from portfolio import price_option
+from lattice import option_steps
+
+RESULT_FIELDS = ["line", "type", "asset", "strike", "days", "barrier", "price", "payoff", "error"]
+
+
+def read_records(path):
+    """
+    Reads the records of a CSV file (with a header line) or of a JSON Lines file, one at a time
+    A record is either an asset: kind=asset, name, price; or an option: kind=option, type (one of OPTION_TYPES),
+    asset (name of an asset defined before), strike, days, barrier (barrier options only) and optionally sigma
+    :param path: Path of the file, files ending with .csv are read as CSV
+    :return: Generator of dictionaries for a CSV file and of lines for a JSON Lines file, the lines are parsed by
+    price_records so that a malformed line is reported as an invalid record
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            for record in csv.DictReader(f):
+                yield record
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def create_option(record, assets):
+    """
+    :param record: Dictionary describing an option
+    :param assets: Dictionary {name: Asset} of the assets already defined
+    :return: The option
+    """
+    option_type = OPTION_TYPES.get(record.get("type"))
+    asset = assets.get(record.get("asset"))
+    if option_type is None or asset is None:
+        raise ValueError("Unknown type of option or asset")
+    kwargs = {"asset": asset, "strike": float(record["strike"]), "days": int(record["days"])}
+    if issubclass(option_type, BarrierOption):
+        kwargs["barrier"] = float(record["barrier"])
+    return option_type(**kwargs)
+
+
+def price_record_chunk(chunk, rf, size_steps, engine):
+    """
+    Prices a chunk of [line, record, option, sigma], the options with a closed form are priced together
+    :return: List of result dictionaries
+    """
+    prices = {}
+    # The maturities are rounded to whole steps as in price_option, so a result does not depend on the chunk it is in
+    steps = {item[0]: option_steps(item[2], size_steps) for item in chunk}
+    analytic = [item for item in chunk if engine is None and has_closed_form(item[2]) and steps[item[0]] > 0]
+    if analytic:
+        values = analytic_prices([item[2] for item in analytic], rf, [item[3] for item in analytic],
+                                 T=[steps[item[0]] * size_steps for item in analytic])
+        for item, price in zip(analytic, values):
+            prices[item[0]] = float(price)
+
+    results = []
+    for line, record, option, sigma in chunk:
+        result = {"line": line, "type": record.get("type"), "asset": option.asset.name, "strike": option.strike,
+                  "days": option.days, "barrier": option.barrier if isinstance(option, BarrierOption) else None}
+        try:
+            if line not in prices:
+                prices[line] = price_option(option, rf, sigma, steps[line], size_steps, engine=engine)
+            result["price"] = prices[line]
+            result["payoff"] = option.payoff()
+        except ValueError as e:
+            result["error"] = str(e)
+        # The option is not kept by its asset once priced, so the memory does not grow with the input
+        option.asset.remove_dependent(option)
+        results.append(result)
+    return results
+
+
+def price_records(records, rf, sigma, size_steps, engine=None, chunk_size=1000):
+    """
+    Prices a stream of records, only chunk_size options are kept in memory at once
+    An asset record creates the asset, or changes its price if it already exists
+    :param records: Iterable of dictionaries or of JSON objects, see read_records
+    :param rf: Risk-free interest rate
+    :param sigma: Default volatility, a record can give its own sigma
+    :param size_steps: Size of the steps in years for the lattice and Monte Carlo engines
+    :param engine: Optional engine used for every option, see portfolio.price_option
+    :param chunk_size: Number of options priced together
+    :return: Generator of result dictionaries, in the order of the records
+    """
+    assets = {}
+    chunk = []
+    for line, record in enumerate(records, start=1):
+        option = None
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError("A record should be an object")
+            if record.get("kind") == "asset":
+                name, price = record["name"], float(record["price"])
+                if price <= 0:
+                    raise ValueError("The price of an asset should be positive")
+                if name in assets:
+                    # The pending options are priced with the former price of the asset
+                    for result in price_record_chunk(chunk, rf, size_steps, engine):
+                        yield result
+                    chunk = []
+                    assets[name].actual_price = price
+                else:
+                    assets[name] = Asset(name=name, initial_price=price)
+                continue
+            option = create_option(record, assets)
+            option_sigma = float(record["sigma"]) if record.get("sigma") not in (None, "") else sigma
+        except (KeyError, TypeError, ValueError) as e:
+            if option is not None:
+                # The record is rejected after its option was created, its asset should not keep it
+                option.asset.remove_dependent(option)
+            for result in price_record_chunk(chunk, rf, size_steps, engine):
+                yield result
+            chunk = []
+            yield {"line": line, "type": record.get("type") if isinstance(record, dict) else None,
+                   "error": "Invalid record: {}".format(e)}
+            continue
+        chunk.append([line, record, option, option_sigma])
+        if len(chunk) >= chunk_size:
+            for result in price_record_chunk(chunk, rf, size_steps, engine):
+                yield result
+            chunk = []
+    for result in price_record_chunk(chunk, rf, size_steps, engine):
+        yield result
+
+
+def write_results(results, path):
+    """
+    Writes the results as soon as they are computed, as CSV if path ends with .csv and as JSON Lines otherwise
+    :param results: Iterable of result dictionaries
+    :param path: Path of the output file
+    :return: The number of results written
+    """
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = None
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+        for result in results:
+            if writer is None:
+                f.write(json.dumps(result) + "\n")
+            else:
+                writer.writerow(result)
+            count += 1
+    return count
+
+
+def batch_main(argv=None):
+    """
+    Entry point of the batch mode: python main.py input output --sigma 0.2 [--rf 0.01] [--size-steps 0.0027]
+    :param argv: Command line arguments, sys.argv by default
+    :return:
+    """
+    parser = argparse.ArgumentParser(description="Prices a book of options read from a CSV or JSON Lines file")
+    parser.add_argument("input", help="CSV or JSON Lines file of assets and options")
+    parser.add_argument("output", help="CSV or JSON Lines file of results")
+    parser.add_argument("--sigma", type=float, required=True, help="default volatility")
+    parser.add_argument("--rf", type=float, default=0.0, help="risk-free interest rate")
+    parser.add_argument("--size-steps", type=float, default=1 / 365, help="size of the steps in years")
+    parser.add_argument("--engine", choices=["analytic", "lattice", "trinomial", "montecarlo"], default=None,
+                        help="engine used for every option, by default the fastest one for each option")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="number of options priced together")
+    args = parser.parse_args(argv)
+    count = write_results(price_records(read_records(args.input), args.rf, args.sigma, args.size_steps,
+                                        engine=args.engine, chunk_size=args.chunk_size), args.output)
+    print("{count} results written in {output}".format(count=count, output=args.output))
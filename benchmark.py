@@ -0,0 +1,156 @@
+import argparse
+import json
+import time
+import tracemalloc
+import numpy as np
+from classes import *
+from lattice import *
+
+# Sizes used by each benchmark, the quick run only keeps the smallest ones
+LATTICE_STEPS = [100, 1000, 10000, 50000]
+PORTFOLIO_SIZES = [10, 1000, 100000]
+HISTORY_LENGTHS = [1, 1000, 1000000, 10000000]
+QUICK_COUNT = 2
+
+
+def measure(function, repeat=3):
+    """
+    Runs a function several times, then once more while tracing the memory so that tracing does not slow the timings
+    :param function: function without parameters
+    :param repeat: Number of timed runs, the fastest one is kept
+    :return: [best time in seconds, peak memory allocated during the traced run in bytes]
+    """
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return [best, peak]
+
+
+def make_asset(history_length):
+    """
+    :param history_length: Number of prices in the history of the asset
+    :return: An asset whose prices oscillate around 100
+    """
+    asset = Asset(name="bench", initial_price=100.0)
+    if history_length > 1:
+        asset.price_history.extend(100 + np.sin(np.arange(history_length - 1)))
+    return asset
+
+
+def make_portfolio(asset, size):
+    """
+    :return: List of size options cycling through every type of option
+    """
+    options = []
+    for i in range(size):
+        strike = 80.0 + i % 40
+        kind = i % 4
+        if kind == 0:
+            options.append(CallOption(asset=asset, strike=strike, days=30))
+        elif kind == 1:
+            options.append(PutOption(asset=asset, strike=strike, days=30))
+        elif kind == 2:
+            options.append(UpAndOutCall(asset=asset, strike=strike, days=30, barrier=130.0))
+        else:
+            options.append(LoopbackPut(asset=asset, strike=strike, days=30))
+    return options
+
+
+def bench_lattice(N):
+    option = CallOption(asset=make_asset(1), strike=100.0, days=365)
+    return measure(lambda: binomial_price(option, 0.01, 0.2, N, 1 / N), repeat=1 if N > 10000 else 3), N
+
+
+def bench_payoff(size):
+    options = make_portfolio(make_asset(1), size)
+    return measure(lambda: [option.payoff() for option in options]), size
+
+
+def bench_extrema(history_length):
+    option = UpAndOutCall(asset=make_asset(history_length), strike=100.0, days=30, barrier=130.0)
+    calls = 100000
+    return measure(lambda: [(option.Mt(), option.mt()) for i in range(calls)]), calls
+
+
+def bench_setter(history_length):
+    asset = make_asset(history_length)
+    ticks = 100000
+    prices = (100 + np.cos(np.arange(ticks))).tolist()
+
+    def run():
+        for price in prices:
+            asset.actual_price = price
+    return measure(run), ticks
+
+
+BENCHMARKS = [("lattice", "N", LATTICE_STEPS, bench_lattice),
+              ("payoff", "options", PORTFOLIO_SIZES, bench_payoff),
+              ("extrema", "history", HISTORY_LENGTHS, bench_extrema),
+              ("setter", "history", HISTORY_LENGTHS, bench_setter)]
+
+
+def run_benchmarks(quick=False):
+    """
+    Runs every benchmark
+    :param quick: If True only the smallest sizes are used
+    :return: Dictionary {name/size: {"seconds", "peak_memory", "throughput"}}, the throughput is in operations per
+    second where an operation is a tree step, an option, an extrema query or a tick
+    """
+    results = {}
+    for name, label, sizes, bench in BENCHMARKS:
+        for size in sizes[:QUICK_COUNT] if quick else sizes:
+            [seconds, peak], operations = bench(size)
+            key = "{name}/{label}={size}".format(name=name, label=label, size=size)
+            results[key] = {"seconds": seconds, "peak_memory": peak, "throughput": operations / seconds}
+            print("{key:<32} {seconds:>12.6f}s {peak:>14d}B {throughput:>16.1f}/s".format(
+                key=key, seconds=seconds, peak=peak, throughput=operations / seconds))
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compares results with a baseline
+    :param results: Dictionary given by run_benchmarks
+    :param baseline: Dictionary given by an earlier run_benchmarks
+    :param tolerance: Relative slow down allowed before a benchmark is flagged
+    :return: List of [key, baseline seconds, seconds] for the benchmarks slower than the baseline
+    """
+    regressions = []
+    for key, result in results.items():
+        if key in baseline and result["seconds"] > baseline[key]["seconds"] * (1 + tolerance):
+            regressions.append([key, baseline[key]["seconds"], result["seconds"]])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the pricing hot paths")
+    parser.add_argument("--quick", action="store_true", help="only run the smallest sizes")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="JSON file of the baseline")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slow down flagged as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(quick=args.quick)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Baseline written in {}".format(args.baseline))
+    else:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print("No baseline found in {}, run with --save to create one".format(args.baseline))
+        else:
+            regressions = compare(results, baseline, tolerance=args.tolerance)
+            for key, before, after in regressions:
+                print("REGRESSION {key}: {before:.6f}s -> {after:.6f}s".format(key=key, before=before, after=after))
+            if regressions:
+                raise SystemExit(1)
+            print("No regression against {}".format(args.baseline))
@@ -0,0 +1,213 @@
+import numpy as np
+from classes import *
+from analytic import BARRIER_TYPES
+
+# The type code of an option is its index in this list, the order of the types of the menu
+OPTION_CLASSES = list(OPTION_TYPES.values())
+
+# Description of each type code, used to evaluate the payoffs of every type at once
+IS_PUT = np.array([issubclass(cls, PutOption) for cls in OPTION_CLASSES])
+IS_LOOPBACK = np.array([issubclass(cls, (LoopbackCall, LoopbackPut)) for cls in OPTION_CLASSES])
+IS_BARRIER = np.array([issubclass(cls, BarrierOption) for cls in OPTION_CLASSES])
+IS_UP = np.array([cls in BARRIER_TYPES and not BARRIER_TYPES[cls][1] for cls in OPTION_CLASSES])
+IS_IN = np.array([cls in BARRIER_TYPES and BARRIER_TYPES[cls][0] for cls in OPTION_CLASSES])
+
+
+def barrier_active(types, barriers, maximum, minimum):
+    """
+    Evaluates the is_active method of barrier options given by columns, the arrays are broadcast together
+    :param types: Array of type codes
+    :param barriers: Array of barriers
+    :param maximum: Array of the maximum reached by the assets
+    :param minimum: Array of the minimum reached by the assets
+    :return: Boolean array, meaningless for the options without barrier
+    """
+    is_up = IS_UP[types]
+    is_in = IS_IN[types]
+    with np.errstate(invalid="ignore"):
+        # Up and in: Mt >= barrier, up and out: Mt <= barrier, down and in: mt <= barrier, down and out: mt >= barrier
+        return np.where(is_up, np.where(is_in, maximum >= barriers, maximum <= barriers),
+                        np.where(is_in, minimum <= barriers, minimum >= barriers))
+
+
+class OptionBook(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Book of options stored as columns: type code, strike, barrier (NaN without barrier), maturity in days and index
+        of the asset in the list of assets of the book. The payoffs of every option are evaluated at once
+        :param args:
+        :param kwargs: capacity: initial number of options the columns can hold
+        """
+        capacity = kwargs.get("capacity", 1024)
+        if isinstance(capacity, int) and capacity > 0:
+            self.__types = np.empty(capacity, dtype=np.int8)
+            self.__strikes = np.empty(capacity)
+            self.__barriers = np.empty(capacity)
+            self.__days = np.empty(capacity, dtype=np.int32)
+            self.__asset_indexes = np.empty(capacity, dtype=np.int32)
+            self.__size = 0
+            self.__assets = []
+            self.__asset_index = {}
+        else:
+            raise ValueError("The capacity should be a positive integer")
+
+    @classmethod
+    def from_options(cls, options):
+        """
+        :param options: List of options
+        :return: An OptionBook holding the options
+        """
+        options = list(options)
+        book = cls(capacity=max(len(options), 1))
+        for option in options:
+            book.add_option(option)
+        return book
+
+    @classmethod
+    def from_columns(cls, assets, types, strikes, barriers, days, asset_indexes):
+        """
+        :param assets: List of the assets of the book
+        :param types, strikes, barriers, days, asset_indexes: Arrays of one value per option, see the properties of the
+        same names. They are used as they are, memory mapped arrays included, and only copied when an option is added
+        :return: An OptionBook holding the options
+        """
+        size = len(types)
+        if any(len(column) != size for column in (strikes, barriers, days, asset_indexes)):
+            raise ValueError("The columns should have the same length")
+        if size > 0 and not 0 <= int(asset_indexes.min()) <= int(asset_indexes.max()) < len(assets):
+            raise ValueError("The index of an asset is out of range")
+        book = cls(capacity=1)
+        if size > 0:
+            book.__types, book.__strikes, book.__barriers = types, strikes, barriers
+            book.__days, book.__asset_indexes = days, asset_indexes
+            book.__size = size
+        for asset in assets:
+            book.add_asset(asset)
+        return book
+
+    def __reserve(self, size):
+        # Amortized doubling of the columns
+        if size > len(self.__strikes):
+            capacity = max(size, 2 * len(self.__strikes))
+            for name in ("_OptionBook__types", "_OptionBook__strikes", "_OptionBook__barriers", "_OptionBook__days",
+                         "_OptionBook__asset_indexes"):
+                column = getattr(self, name)
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self.__size] = column[:self.__size]
+                setattr(self, name, grown)
+
+    def add_asset(self, asset):
+        """
+        :param asset: An asset
+        :return: The index of the asset in the book, it is added if needed
+        """
+        index = self.__asset_index.get(id(asset))
+        if index is None:
+            index = len(self.__assets)
+            self.__assets.append(asset)
+            self.__asset_index[id(asset)] = index
+        return index
+
+    def append(self, type_code, asset, strike, days, barrier=np.nan):
+        """
+        Adds an option to the book without creating an Option object
+        :param type_code: Index of the type of the option in OPTION_CLASSES
+        :param asset: The asset of the option
+        :param strike: Strike price
+        :param days: Maturity in days
+        :param barrier: Barrier price, only for barrier options
+        :return:
+        """
+        if not 0 <= type_code < len(OPTION_CLASSES):
+            raise ValueError("Unknown type of option")
+        if IS_BARRIER[type_code] == np.isnan(barrier):
+            raise ValueError("Barrier options, and only them, should have a barrier")
+        self.__reserve(self.__size + 1)
+        self.__types[self.__size] = type_code
+        self.__strikes[self.__size] = strike
+        self.__barriers[self.__size] = barrier
+        self.__days[self.__size] = days
+        self.__asset_indexes[self.__size] = self.add_asset(asset)
+        self.__size += 1
+
+    def add_option(self, option):
+        """
+        Adds an existing option to the book
+        :param option: The option
+        :return:
+        """
+        barrier = option.barrier if isinstance(option, BarrierOption) else np.nan
+        self.append(OPTION_CLASSES.index(type(option)), option.asset, option.strike, option.days, barrier)
+
+    def option(self, index):
+        """
+        :param index: Index of an option of the book
+        :return: A new Option object equal to the option of the book
+        """
+        cls = OPTION_CLASSES[self.__types[index]]
+        kwargs = {"asset": self.__assets[self.__asset_indexes[index]], "strike": float(self.__strikes[index]),
+                  "days": int(self.__days[index])}
+        if IS_BARRIER[self.__types[index]]:
+            kwargs["barrier"] = float(self.__barriers[index])
+        return cls(**kwargs)
+
+    def to_options(self):
+        """
+        :return: List of Option objects, in the order of the book
+        """
+        return [self.option(index) for index in range(self.__size)]
+
+    @property
+    def assets(self):
+        return list(self.__assets)
+
+    @property
+    def types(self):
+        return self.__types[:self.__size]
+
+    @property
+    def strikes(self):
+        return self.__strikes[:self.__size]
+
+    @property
+    def barriers(self):
+        return self.__barriers[:self.__size]
+
+    @property
+    def days(self):
+        return self.__days[:self.__size]
+
+    @property
+    def asset_indexes(self):
+        return self.__asset_indexes[:self.__size]
+
+    def __len__(self):
+        return self.__size
+
+    def payoffs(self, spots=None, Mt=None, mt=None):
+        """
+        Payoffs of every option of the book, equal to the payoff method of each option
+        :param spots: Optional array of the prices of the assets of the book, the actual prices by default
+        :param Mt: Optional array of the maximum of the assets, the maximum of their price history by default
+        :param mt: Optional array of the minimum of the assets, the minimum of their price history by default
+        :return: Array of payoffs
+        """
+        if spots is None:
+            spots = [asset.actual_price for asset in self.__assets]
+        if Mt is None:
+            Mt = [asset.price_history.max for asset in self.__assets]
+        if mt is None:
+            mt = [asset.price_history.min for asset in self.__assets]
+        indexes = self.asset_indexes
+        spot = np.asarray(spots, dtype=float)[indexes]
+        maximum = np.asarray(Mt, dtype=float)[indexes]
+        minimum = np.asarray(mt, dtype=float)[indexes]
+        types = self.types
+        is_put = IS_PUT[types]
+
+        # The loopback options pay on the extremum instead of the actual price
+        underlying = np.where(IS_LOOPBACK[types], np.where(is_put, minimum, maximum), spot)
+        payoffs = np.maximum(np.where(is_put, self.strikes - underlying, underlying - self.strikes), 0)
+
+        active = barrier_active(types, self.barriers, maximum, minimum)
+        return np.where(IS_BARRIER[types] & ~active, 0.0, payoffs)
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from classes import *
+from portfolio import price_option
+
+
+class PricingCache(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Cache of option prices with a bounded size, the least recently used price is evicted first
+        The prices of the options written on an asset are dropped as soon as the price of the asset changes
+        :param args:
+        :param kwargs: maxsize: maximum number of prices kept; pricer: function (option, rf, sigma, N, size_steps)
+        computing a price, portfolio.price_option by default
+        """
+        maxsize = kwargs.get("maxsize", 1024)
+        pricer = kwargs.get("pricer", price_option)
+        if isinstance(maxsize, int) and maxsize > 0 and callable(pricer):
+            self.__maxsize = maxsize
+            self.__pricer = pricer
+            self.__prices = OrderedDict()
+            # Keys of the cached prices of each asset, used to invalidate them when the asset ticks
+            self.__keys_by_asset = {}
+            self.__hits = 0
+            self.__misses = 0
+            self.__evictions = 0
+            self.__invalidations = 0
+        else:
+            raise ValueError("The size of the cache should be a positive integer and the pricer a function")
+
+    @staticmethod
+    def key(option, rf, sigma, N, size_steps):
+        """
+        :return: The key identifying the price of an option with these parameters, the asset comes first: the price
+        also depends on its history, so the options of two assets with the same actual price never share a key
+        """
+        barrier = option.barrier if isinstance(option, BarrierOption) else None
+        return (option.asset, type(option), option.asset.actual_price, option.strike, barrier, sigma, rf, N,
+                size_steps)
+
+    def price(self, option, rf, sigma, N, size_steps):
+        """
+        Gives the price of an option, computed by the pricer only if it is not in the cache
+        :param option: The option we want to price
+        :param rf: Risk-free interest rate
+        :param sigma: Volatility
+        :param N: Number of steps until maturity
+        :param size_steps: Size of the steps in years
+        :return: The price of the option
+        """
+        key = self.key(option, rf, sigma, N, size_steps)
+        if key in self.__prices:
+            self.__hits += 1
+            self.__prices.move_to_end(key)
+            return self.__prices[key]
+
+        self.__misses += 1
+        price = self.__pricer(option, rf, sigma, N, size_steps)
+        asset = option.asset
+        if asset not in self.__keys_by_asset:
+            self.__keys_by_asset[asset] = set()
+            asset.subscribe(self.invalidate)
+        self.__keys_by_asset[asset].add(key)
+        self.__prices[key] = price
+        if len(self.__prices) > self.__maxsize:
+            old_key = self.__prices.popitem(last=False)[0]
+            self.__keys_by_asset[old_key[0]].discard(old_key)
+            self.__evictions += 1
+        return price
+
+    def invalidate(self, asset):
+        """
+        Drops the prices of the options written on an asset, it is called by the asset when its price changes
+        :param asset: The asset
+        :return:
+        """
+        keys = self.__keys_by_asset.get(asset, ())
+        for key in keys:
+            del self.__prices[key]
+        self.__invalidations += len(keys)
+        if keys:
+            self.__keys_by_asset[asset] = set()
+
+    def clear(self):
+        for asset in self.__keys_by_asset:
+            asset.unsubscribe(self.invalidate)
+        self.__prices.clear()
+        self.__keys_by_asset.clear()
+
+    @property
+    def maxsize(self):
+        return self.__maxsize
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    @property
+    def evictions(self):
+        return self.__evictions
+
+    @property
+    def invalidations(self):
+        return self.__invalidations
+
+    def stats(self):
+        """
+        :return: Dictionary holding the counters of the cache
+        """
+        return {"size": len(self), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "invalidations": self.invalidations}
+
+    def __len__(self):
+        return len(self.__prices)
+
+    def __str__(self):
+        return "Pricing cache: {size}/{maxsize} prices, {hits} hits, {misses} misses, {evictions} evictions, " \
+               "{invalidations} invalidations".format(**self.stats())
@@ -1,7 +1,251 @@
 import datetime
+import time
+import weakref
+import numpy as np
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def slots_state(obj):
+    """
+    Gives the attributes of an object whose classes use __slots__, as the dictionary pickle expects
+    :param obj: The object
+    :return: Dictionary {attribute name: value}, the private names being mangled
+    """
+    state = {}
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name in ("__weakref__", "__dict__"):
+                continue
+            if name.startswith("__") and not name.endswith("__"):
+                name = "_" + cls.__name__.lstrip("_") + name
+            if hasattr(obj, name):
+                state[name] = getattr(obj, name)
+    return state
+
+
+def restore_slots(obj, state):
+    """
+    Sets back the attributes given by slots_state
+    :param obj: The object
+    :param state: Dictionary {attribute name: value}
+    :return:
+    """
+    for name, value in state.items():
+        object.__setattr__(obj, name, value)
+
+
+class PriceHistory(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Append only history of the prices of an asset, stored in numpy arrays that double their size when full
+        The running maximum and minimum are updated on each append so reading them is O(1)
+        The timestamps are stored as integers in microseconds since the epoch (UTC) and should not decrease: the prices
+        are looked up by timestamp with a binary search, so an append older than the last price raises a ValueError
+        :param args:
+        :param kwargs: capacity: the initial size of the arrays; timestamps, prices: existing arrays to use as storage,
+        size: number of prices already stored in them, max, min: their extrema if already known
+        """
+        capacity = kwargs.get("capacity", 16)
+        timestamps = kwargs.get("timestamps", None)
+        prices = kwargs.get("prices", None)
+        if timestamps is not None and prices is not None:
+            size = kwargs.get("size", len(prices))
+            if len(timestamps) != len(prices) or not 0 <= size <= len(prices):
+                raise ValueError("The timestamps and prices arrays should have the same length")
+            self.__timestamps = timestamps
+            self.__prices = prices
+            self.__size = size
+            # The extrema are only computed when they are not given, so that reopening a big history is O(1)
+            if "max" in kwargs:
+                self.__max = kwargs["max"]
+            else:
+                self.__max = float(prices[:size].max()) if size > 0 else None
+            if "min" in kwargs:
+                self.__min = kwargs["min"]
+            else:
+                self.__min = float(prices[:size].min()) if size > 0 else None
+        elif isinstance(capacity, int) and capacity > 0:
+            self.__timestamps = np.empty(capacity, dtype=np.int64)
+            self.__prices = np.empty(capacity)
+            self.__size = 0
+            self.__max = None
+            self.__min = None
+        else:
+            raise ValueError("The capacity should be a positive integer")
+
+    @staticmethod
+    def to_microseconds(timestamp):
+        """
+        :param timestamp: None for the current time, a datetime (naive datetimes are in local time, as for
+        datetime.timestamp), a numpy datetime64 (UTC) or a number of microseconds
+        :return: The number of microseconds since the epoch
+        """
+        if timestamp is None:
+            return time.time_ns() // 1000
+        if isinstance(timestamp, datetime.datetime):
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.astimezone()
+            return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+        if isinstance(timestamp, np.datetime64):
+            return int(timestamp.astype("datetime64[us]").astype(np.int64))
+        return int(timestamp)
+
+    def _allocate(self, capacity):
+        """
+        Gives bigger arrays holding the prices already stored, subclasses can store them elsewhere than in memory
+        :param capacity: The new size of the arrays
+        :return: [timestamps, prices]
+        """
+        timestamps = np.empty(capacity, dtype=np.int64)
+        prices = np.empty(capacity)
+        timestamps[:self.__size] = self.__timestamps[:self.__size]
+        prices[:self.__size] = self.__prices[:self.__size]
+        return [timestamps, prices]
+
+    def _commit(self):
+        """
+        Called after each append, subclasses can use it to save the size and extrema of the history
+        :return:
+        """
+        pass
+
+    def __reserve(self, size):
+        # Amortized doubling of the arrays
+        if size > len(self.__prices):
+            self.__timestamps, self.__prices = self._allocate(max(size, 2 * len(self.__prices)))
+
+    def __default_time(self):
+        # The clock can go backwards and the ticks of a feed can be ahead of it, the prices given without timestamp
+        # should not fail because of that
+        now = self.to_microseconds(None)
+        if self.__size > 0:
+            return max(now, int(self.__timestamps[self.__size - 1]))
+        return now
+
+    def append(self, price, timestamp=None):
+        """
+        Adds a price at the end of the history
+        :param price: The new price
+        :param timestamp: The time of the price, by default the current time or the time of the last price if the clock
+        is behind it
+        :return:
+        """
+        timestamp = self.__default_time() if timestamp is None else self.to_microseconds(timestamp)
+        if self.__size > 0 and timestamp < self.__timestamps[self.__size - 1]:
+            raise ValueError("The timestamp is older than the last price of the history")
+        self.__reserve(self.__size + 1)
+        self.__timestamps[self.__size] = timestamp
+        self.__prices[self.__size] = price
+        self.__size += 1
+        if self.__max is None or price > self.__max:
+            self.__max = price
+        if self.__min is None or price < self.__min:
+            self.__min = price
+        self._commit()
+
+    def extend(self, prices, timestamps=None):
+        """
+        Adds several prices at the end of the history
+        :param prices: Array of prices
+        :param timestamps: Array of microseconds since the epoch in increasing order, the same default time as append
+        for every price by default
+        :return:
+        """
+        prices = np.asarray(prices, dtype=float)
+        if len(prices) == 0:
+            return
+        if timestamps is None:
+            timestamps = np.full(len(prices), self.__default_time(), dtype=np.int64)
+        else:
+            timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.int64), prices.shape)
+        if np.any(timestamps[1:] < timestamps[:-1]) or (
+                self.__size > 0 and timestamps[0] < self.__timestamps[self.__size - 1]):
+            raise ValueError("The timestamps should be in increasing order and not older than the last price")
+        size = self.__size + len(prices)
+        self.__reserve(size)
+        self.__timestamps[self.__size:size] = timestamps
+        self.__prices[self.__size:size] = prices
+        self.__size = size
+        chunk_max, chunk_min = float(prices.max()), float(prices.min())
+        if self.__max is None or chunk_max > self.__max:
+            self.__max = chunk_max
+        if self.__min is None or chunk_min < self.__min:
+            self.__min = chunk_min
+        self._commit()
+
+    @property
+    def prices(self):
+        """
+        :return: Read only view of the prices
+        """
+        view = self.__prices[:self.__size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def timestamps(self):
+        """
+        :return: Read only view of the timestamps as datetime64
+        """
+        view = self.__timestamps[:self.__size].view("datetime64[us]")
+        view.flags.writeable = False
+        return view
+
+    @property
+    def max(self):
+        return self.__max
+
+    @property
+    def min(self):
+        return self.__min
+
+    @property
+    def last(self):
+        return self.__prices[self.__size - 1] if self.__size > 0 else None
+
+    @property
+    def last_timestamp(self):
+        """
+        :return: The timestamp of the last price in microseconds since the epoch, None if the history is empty
+        """
+        return int(self.__timestamps[self.__size - 1]) if self.__size > 0 else None
+
+    # The methods below keep the interface of the dictionary that used to store the history
+    def __len__(self):
+        return self.__size
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, timestamp):
+        # The last price recorded at this time is returned
+        index = np.searchsorted(self.__timestamps[:self.__size], self.to_microseconds(timestamp), side="right") - 1
+        if index < 0 or self.__timestamps[index] != self.to_microseconds(timestamp):
+            raise KeyError(timestamp)
+        return float(self.__prices[index])
+
+    def keys(self):
+        # Timezone aware datetimes, a naive datetime would be read back as local time by to_microseconds
+        return [EPOCH + datetime.timedelta(microseconds=timestamp)
+                for timestamp in self.__timestamps[:self.__size].tolist()]
+
+    def values(self):
+        return self.prices
+
+    def items(self):
+        return zip(self.keys(), self.prices.tolist())
+
+    def __str__(self):
+        if self.__size <= 10:
+            return str(dict(self.items()))
+        return "{size} prices from {first} to {last}, min: {min}, max: {max}".format(
+            size=self.__size, first=self.timestamps[0], last=self.timestamps[-1], min=self.min, max=self.max)
 
 
 class Asset(object):
+    __slots__ = ("__initial_price", "__actual_price", "__price_history", "__name", "__dependents", "__subscribers")
+
     def __init__(self, *args, **kwargs):
         """
         Create an asset object
@@ -14,8 +258,13 @@ class Asset(object):
             self.__initial_price = init_price
             self.__actual_price = init_price
             # We're gonna store the price history
-            self.__price_history = {datetime.datetime.now(): self.__actual_price}
+            self.__price_history = PriceHistory()
+            self.__price_history.append(self.__actual_price)
             self.__name = name
+            # Options written on this asset and functions called after each price change, the asset only keeps weak
+            # references to the options so that the options nobody uses any more are not kept alive and revalued
+            self.__dependents = weakref.WeakSet()
+            self.__subscribers = []
         else:
             raise ValueError("The initial price should be a integer or a floating point number")
 
@@ -29,13 +278,109 @@ class Asset(object):
 
     @actual_price.setter
     def actual_price(self, val):
+        # The price is recorded first, the asset is left unchanged if the history rejects it
+        self.__price_history.append(val)
         self.__actual_price = val
-        self.__price_history[datetime.datetime.now()] = self.__actual_price
+        self.__notify()
+
+    def update_prices(self, prices, timestamps=None):
+        """
+        Records several prices at once, the options are only revalued with the last one
+        :param prices: List or array of prices, the last one becomes the actual price
+        :param timestamps: Optional array of microseconds since the epoch, the current time by default
+        :return:
+        """
+        if len(prices) == 0:
+            return
+        self.__price_history.extend(prices, timestamps)
+        self.__actual_price = float(prices[-1])
+        self.__notify()
+
+    def __notify(self):
+        # Only the options written on this asset are revalued
+        for option in tuple(self.__dependents):
+            option.on_price_change()
+        for callback in self.__subscribers:
+            callback(self)
+
+    @property
+    def dependents(self):
+        """
+        :return: The options written on this asset
+        """
+        return tuple(self.__dependents)
+
+    def add_dependent(self, option):
+        """
+        Registers an option so that it is revalued when the price of the asset changes
+        :param option: An option written on this asset
+        :return:
+        """
+        self.__dependents.add(option)
+
+    def remove_dependent(self, option):
+        self.__dependents.discard(option)
+
+    def subscribe(self, callback):
+        """
+        Registers a function called with the asset after each price change, once its options are revalued
+        :param callback: function taking the asset as parameter
+        :return:
+        """
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __getstate__(self):
+        # The options and subscribers are not pickled with the asset, so that pickling an option does not pickle
+        # every other option written on the same asset
+        state = slots_state(self)
+        del state["_Asset__dependents"]
+        state["_Asset__subscribers"] = []
+        return state
+
+    def __setstate__(self, state):
+        restore_slots(self, state)
+        self.__dependents = weakref.WeakSet()
 
     @property
     def price_history(self):
+        """
+        :return: The PriceHistory of the asset, it can be read like a dictionary {timestamp: price}
+        """
         return self.__price_history
 
+    def attach_history(self, history):
+        """
+        Replaces the price history of the asset, for instance by a history stored on disk
+        If the new history is empty the prices already recorded are copied into it, otherwise the actual price of the
+        asset becomes the last price of the new history. The options are revalued and the subscribers called as after
+        a price change
+        :param history: A PriceHistory
+        :return:
+        """
+        if len(history) == 0:
+            history.extend(self.__price_history.prices, self.__price_history.timestamps.view(np.int64))
+        else:
+            self.__actual_price = float(history.last)
+        self.__price_history = history
+        # The actual price and the extrema may have changed, the options and the subscribers such as the caches are told
+        self.__notify()
+
+    def summary(self):
+        """
+        Copy of the asset whose history only holds the actual price and the extrema of the history, which is all the
+        pricers read, so that it can be pickled without its whole history
+        :return: A new Asset
+        """
+        history = self.__price_history
+        asset = Asset(name=self.__name, initial_price=self.__initial_price)
+        asset.attach_history(PriceHistory(timestamps=np.array(history.timestamps[-1:].view(np.int64)),
+                                          prices=np.array([self.__actual_price], dtype=float),
+                                          max=history.max, min=history.min))
+        return asset
+
     @property
     def name(self):
         return self.__name
@@ -52,6 +397,8 @@ class Asset(object):
 
 
 class Option(object):
+    __slots__ = ("__strike", "__asset", "__days", "__maturity", "__payoff", "__weakref__")
+
     def __init__(self, *args, **kwargs):
         """
         An option is defined by its strike price and an asset
@@ -66,6 +413,8 @@ class Option(object):
             self.__asset = asset
             self.__days = days
             self.__maturity = datetime.datetime.now() + datetime.timedelta(days=days)
+            self.__payoff = None
+            self.__register()
         else:
             raise ValueError("The value of either the strike or the asset are of the wrong type")
 
@@ -85,6 +434,49 @@ class Option(object):
     def maturity(self):
         return self.__maturity
 
+    @property
+    def cached_payoff(self):
+        """
+        :return: The payoff of the option, only recomputed when the price of the asset changes
+        """
+        if self.__payoff is None:
+            self.__payoff = self.payoff()
+        return self.__payoff
+
+    def on_price_change(self):
+        """
+        Called by the asset when its price changes
+        :return:
+        """
+        # Option and BarrierOption themselves have no payoff, see __register
+        if hasattr(self, "payoff"):
+            self.__payoff = self.payoff()
+
+    def __register(self):
+        # Only the options with a payoff can be revalued, Option and BarrierOption themselves can not
+        if hasattr(self, "payoff"):
+            self.__asset.add_dependent(self)
+
+    def copy_on(self, asset):
+        """
+        Copy of the option written on another asset, for instance the summary of its asset
+        :param asset: The asset of the copy
+        :return: A new option of the same type
+        """
+        state = slots_state(self)
+        state["_Option__asset"] = asset
+        option = object.__new__(type(self))
+        option.__setstate__(state)
+        return option
+
+    def __getstate__(self):
+        return slots_state(self)
+
+    def __setstate__(self, state):
+        # The asset does not pickle its dependents, the option registers itself again once unpickled
+        restore_slots(self, state)
+        self.__register()
+
     def __str__(self):
         return "Option: \n\t" \
                "{myasset} \n\t" \
@@ -93,6 +485,8 @@ class Option(object):
 
 
 class CallOption(Option):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         A call option doesn't have extra parameters, however defining it separately allows us to define the
@@ -105,12 +499,24 @@ class CallOption(Option):
     def payoff(self):
         return max(0, self.asset.actual_price - self.strike)
 
+    def simulated_payoff(self, prices, Mt, mt):
+        """
+        Vectorized payoff used to price the option on simulated paths
+        :param prices: Array of the prices of the asset at maturity
+        :param Mt: Array of the maximum price reached on each path
+        :param mt: Array of the minimum price reached on each path
+        :return: Array of payoffs
+        """
+        return np.maximum(prices - self.strike, 0)
+
     def __str__(self):
         return super().__str__() + "Type: Call Option\n\t" \
-                                   "Payoff: {payoff}\n\t".format(payoff=self.payoff())
+                                   "Payoff: {payoff}\n\t".format(payoff=self.cached_payoff)
 
 
 class PutOption(Option):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         We define a put option the same way we defined a call option
@@ -122,12 +528,17 @@ class PutOption(Option):
     def payoff(self):
         return max(0, self.strike - self.asset.actual_price)
 
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.maximum(self.strike - prices, 0)
+
     def __str__(self):
         return super().__str__() + "Type: Put Option\n\t" \
-                                   "Payoff: {payoff}\n\t".format(payoff=self.payoff())
+                                   "Payoff: {payoff}\n\t".format(payoff=self.cached_payoff)
 
 
 class BarrierOption(Option):
+    __slots__ = ("__barrier", "__active")
+
     def __init__(self, *args, **kwargs):
         """
         Creating a barrier option, which is defined as an option with a barrier price
@@ -137,6 +548,7 @@ class BarrierOption(Option):
         barrier = kwargs.get('barrier', None)
         if isinstance(barrier, (int, float)):
             self.__barrier = barrier
+            self.__active = None
         else:
             raise ValueError("The barrier price should be an integer or a floating point number")
         super().__init__(*args, **kwargs)
@@ -149,24 +561,55 @@ class BarrierOption(Option):
         """
         :return: The Mt value of this option
         """
-        return max(self.asset.price_history.values())
+        return self.asset.price_history.max
 
     def mt(self):
         """
         :return: The mt value of this option
         """
-        return min(self.asset.price_history.values())
+        return self.asset.price_history.min
+
+    def is_active(self, Mt, mt):
+        """
+        Tells if the option is knocked in (or not knocked out) given the maximum and minimum of the asset
+        Defined by each barrier type, it works on numbers as well as on arrays of simulated values
+        :param Mt: The maximum price of the asset
+        :param mt: The minimum price of the asset
+        :return: None for BarrierOption itself, which has no barrier type
+        """
+        return None
+
+    def __state(self):
+        active = self.is_active(self.Mt(), self.mt())
+        return None if active is None else bool(active)
+
+    @property
+    def active(self):
+        """
+        :return: The knock in / knock out state of the option, only recomputed when the price of the asset changes,
+        None for BarrierOption itself
+        """
+        if self.__active is None:
+            self.__active = self.__state()
+        return self.__active
+
+    def on_price_change(self):
+        self.__active = self.__state()
+        super().on_price_change()
 
     def __str__(self):
         return super().__str__() + "Type: Barrier Option\n\t" \
                                    "Barrier: {barr}\n\t" \
                                    "Mt: {Mt}\n\t" \
                                    "mt: {mt}\n\t" \
-                                   "Payoff: {payoff}\n\t".format(payoff=self.payoff(), barr=self.barrier,
+                                   "Payoff: {payoff}\n\t".format(payoff=self.cached_payoff if hasattr(self, "payoff") else None,
+                                                                 barr=self.barrier,
                                                                  Mt=self.Mt(), mt=self.mt())
 
 
 class UpAndInCall(CallOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Up and In Call Barrier Option, the arguments are the same that for a barrier option
@@ -175,14 +618,22 @@ class UpAndInCall(CallOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return Mt >= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.Mt() >= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Up and In Call"
 
 
 class UpAndOutCall(CallOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Up and Out Call Barrier Option, the arguments are the same that for a barrier option
@@ -191,14 +642,22 @@ class UpAndOutCall(CallOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return Mt <= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.Mt() <= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Up and Out Call"
 
 
 class DownAndInCall(CallOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Down and In Call Barrier Option, the arguments are the same that for a barrier option
@@ -207,14 +666,22 @@ class DownAndInCall(CallOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return mt <= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.mt() <= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Down and In Call"
 
 
 class DownAndOutCall(CallOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Down and Out Call Barrier Option, the arguments are the same that for a barrier option
@@ -223,14 +690,22 @@ class DownAndOutCall(CallOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return mt >= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.mt() >= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Down and Out Call"
 
 
 class UpAndInPut(PutOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Up and In Put Barrier Option, the arguments are the same that for a barrier option
@@ -239,14 +714,22 @@ class UpAndInPut(PutOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return Mt >= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.Mt() >= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Up and In Put"
 
 
 class UpAndOutPut(PutOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Up and Out Put Barrier Option, the arguments are the same that for a barrier option
@@ -255,14 +738,22 @@ class UpAndOutPut(PutOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return Mt <= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.Mt() <= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Up and Out Put"
 
 
 class DownAndInPut(PutOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Down and In Put Barrier Option, the arguments are the same that for a barrier option
@@ -271,14 +762,22 @@ class DownAndInPut(PutOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return mt <= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.mt() <= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Down and In Put"
 
 
 class DownAndOutPut(PutOption, BarrierOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Modelization of a Down and Out Put Barrier Option, the arguments are the same that for a barrier option
@@ -287,14 +786,22 @@ class DownAndOutPut(PutOption, BarrierOption):
         """
         super().__init__(*args, **kwargs)
 
+    def is_active(self, Mt, mt):
+        return mt >= self.barrier
+
     def payoff(self):
-        return super().payoff() if self.mt() >= self.barrier else 0
+        return super().payoff() if self.is_active(self.Mt(), self.mt()) else 0
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.where(self.is_active(Mt, mt), super().simulated_payoff(prices, Mt, mt), 0)
 
     def __str__(self):
         return BarrierOption.__str__(self) + "Barrier Type: Down and Out Put"
 
 
 class LoopbackCall(CallOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Loopback call option, no extra parameter but the payoff function changes
@@ -304,13 +811,18 @@ class LoopbackCall(CallOption):
         super().__init__(*args, **kwargs)
 
     def payoff(self):
-        return max(0, max(self.asset.price_history.values()) - self.strike)
+        return max(0, self.asset.price_history.max - self.strike)
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.maximum(Mt - self.strike, 0)
 
     def __str__(self):
         return super().__str__() + "Type of Call: Loopback"
 
 
 class LoopbackPut(PutOption):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Loopback put option, no extra parameter but the payoff function changes
@@ -320,7 +832,19 @@ class LoopbackPut(PutOption):
         super().__init__(*args, **kwargs)
 
     def payoff(self):
-        return max(0, self.strike - min(self.asset.price_history.values()))
+        return max(0, self.strike - self.asset.price_history.min)
+
+    def simulated_payoff(self, prices, Mt, mt):
+        return np.maximum(self.strike - mt, 0)
 
     def __str__(self):
         return super().__str__() + "Type of Put: Loopback"
+
+
+# Name of each type of option, in the order of the menu. The batch files use the same names and the type code of an
+# option in an OptionBook is its index in this dictionary
+OPTION_TYPES = {"Call": CallOption, "Put": PutOption, "Loopback Call": LoopbackCall, "Loopback Put": LoopbackPut,
+                "Barrier Up and In Call": UpAndInCall, "Barrier Up and Out Call": UpAndOutCall,
+                "Barrier Down and In Call": DownAndInCall, "Barrier Down and Out Call": DownAndOutCall,
+                "Barrier Up and In Put": UpAndInPut, "Barrier Up and Out Put": UpAndOutPut,
+                "Barrier Down and In Put": DownAndInPut, "Barrier Down and Out Put": DownAndOutPut}
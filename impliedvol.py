@@ -0,0 +1,95 @@
+import numpy as np
+from classes import *
+from analytic import *
+from lattice import check_lattice_option
+
+# Status of each contract after the resolution
+CONVERGED = 0
+NOT_CONVERGED = 1
+OUT_OF_BOUNDS = 2
+
+
+def implied_volatility(market_prices, spot, strikes, T, rf, is_put, tol=1e-8, vol_tol=1e-8, max_iter=100,
+                       sigma_min=1e-6, sigma_max=10.0):
+    """
+    Finds the volatilities giving the market prices of european calls and puts with the Black-Scholes formula
+    All the contracts are solved at once with Newton steps, a contract whose Newton step leaves its bracket
+    [sigma_min, sigma_max] (narrowed at each iteration) takes a bisection step instead
+    :param market_prices: Array of observed prices
+    :param spot: Price of the underlying asset, a number or an array
+    :param strikes: Array of strikes
+    :param T: Array of times to maturity in years
+    :param rf: Risk-free interest rate
+    :param is_put: Boolean array, True for puts and False for calls
+    :param tol: Tolerance on the price
+    :param vol_tol: Tolerance on the volatility, a contract has converged when both tolerances are reached
+    :param max_iter: Maximum number of iterations
+    :param sigma_min: Lower bound of the volatility
+    :param sigma_max: Upper bound of the volatility
+    :return: [volatilities, status, iterations], the volatility is NaN when the status is not CONVERGED
+    """
+    market_prices = np.asarray(market_prices, dtype=float)
+    shape = market_prices.shape
+    spot, strikes, T, is_put = [np.broadcast_to(np.asarray(x), shape) for x in (spot, strikes, T, is_put)]
+    spot, strikes, T = [x.astype(float) for x in (spot, strikes, T)]
+
+    # Prices reached with the volatility bounds, a market price outside of them (or too close to them to tell the
+    # volatilities apart) has no implied volatility
+    lower = black_scholes(spot, strikes, T, rf, sigma_min, is_put)
+    upper = black_scholes(spot, strikes, T, rf, sigma_max, is_put)
+    valid = (T > 0) & (market_prices > lower + tol) & (market_prices < upper - tol)
+
+    low = np.full(shape, sigma_min)
+    high = np.full(shape, sigma_max)
+    # Brenner-Subrahmanyam approximation as a first guess
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.sqrt(2 * np.pi / T) * market_prices / spot
+    sigma = np.clip(np.nan_to_num(sigma, nan=0.2), 0.01, 2.0)
+    active = valid.copy()
+    iterations = 0
+    while iterations < max_iter and active.any():
+        iterations += 1
+        s, k, t, put, target = spot[active], strikes[active], T[active], is_put[active], market_prices[active]
+        sig = sigma[active]
+        error = black_scholes(s, k, t, rf, sig, put) - target
+
+        # The price is increasing with the volatility, so the sign of the error narrows the bracket
+        lo = np.where(error < 0, sig, low[active])
+        hi = np.where(error > 0, sig, high[active])
+        vega = black_scholes_vega(s, k, t, rf, sig)
+        # Far from the money the price barely moves with the volatility, so the volatility error error / vega
+        # or the width of the bracket is checked as well
+        done = (np.abs(error) < tol) & ((np.abs(error) <= vol_tol * vega) | (hi - lo < vol_tol))
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            newton = sig - error / vega
+        bisection = ~((newton > lo) & (newton < hi)) | ~np.isfinite(newton)
+        step = np.where(bisection, 0.5 * (lo + hi), newton)
+
+        low[active], high[active] = lo, hi
+        sigma[active] = np.where(done, sig, step)
+        indexes = np.flatnonzero(active)
+        active[indexes[done]] = False
+
+    status = np.where(valid, np.where(active, NOT_CONVERGED, CONVERGED), OUT_OF_BOUNDS)
+    return [np.where(status == CONVERGED, sigma, np.nan), status, iterations]
+
+
+def chain_implied_volatility(options, market_prices, rf, tol=1e-8, vol_tol=1e-8, max_iter=100):
+    """
+    Implied volatilities of a list of european calls and puts, the maturity is the number of days of each option
+    :param options: List of options
+    :param market_prices: Array of observed prices, one per option
+    :param rf: Risk-free interest rate
+    :param tol: Tolerance on the price
+    :param vol_tol: Tolerance on the volatility
+    :param max_iter: Maximum number of iterations
+    :return: [volatilities, status, iterations]
+    """
+    for option in options:
+        check_lattice_option(option)
+    spot = [option.asset.actual_price for option in options]
+    strikes = [option.strike for option in options]
+    T = [option.days / 365 for option in options]
+    is_put = [isinstance(option, PutOption) for option in options]
+    return implied_volatility(market_prices, spot, strikes, T, rf, is_put, tol=tol, vol_tol=vol_tol,
+                              max_iter=max_iter)
@@ -0,0 +1,227 @@
+import asyncio
+import time
+from classes import *
+
+
+def parse_ticks(data, received):
+    """
+    Parses lines "name,price" or "name,price,timestamp" (timestamp in microseconds since the epoch)
+    :param data: bytes holding complete lines
+    :param received: Timestamp given to the lines without one
+    :return: [list of ticks (name, price, timestamp), number of lines that could not be parsed]
+    """
+    ticks = []
+    invalid = 0
+    for line in data.split(b"\n"):
+        fields = line.strip().split(b",")
+        try:
+            if len(fields) == 2:
+                ticks.append((fields[0].decode(), float(fields[1]), received))
+            elif len(fields) == 3:
+                ticks.append((fields[0].decode(), float(fields[1]), int(fields[2])))
+            elif fields != [b""]:
+                invalid += 1
+        except (ValueError, UnicodeDecodeError):
+            invalid += 1
+    return [ticks, invalid]
+
+
+class TickIngestor(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Consumes several feeds of ticks concurrently and records them in the histories of the assets
+        The feeds put batches of ticks in a bounded queue: when the consumer is late the feeds wait, which stops the
+        reading of sockets and files (backpressure). The consumer takes every waiting batch at once and records the
+        ticks of each asset with one call to Asset.update_prices, so the options are only revalued with the latest
+        price of the asset (the older ticks are still recorded in the history)
+        The feeds are not synchronized, so the ticks of an asset are sorted by timestamp before being recorded. A tick
+        older than the last price already recorded can not be inserted in the history, it is counted as late
+        :param args:
+        :param kwargs: assets: dictionary {name: Asset}; queue_size: maximum number of batches waiting;
+        on_revalue: optional function called with the asset and its options once they are revalued
+        """
+        assets = kwargs.get("assets", None)
+        queue_size = kwargs.get("queue_size", 64)
+        on_revalue = kwargs.get("on_revalue", None)
+        if isinstance(assets, dict) and isinstance(queue_size, int) and queue_size > 0:
+            self.__assets = assets
+            self.__queue_size = queue_size
+            self.__on_revalue = on_revalue
+            self.__queue = None
+            self.__consumer = None
+            self.__ticks = 0
+            self.__batches = 0
+            self.__revaluations = 0
+            self.__unknown = 0
+            self.__invalid = 0
+            self.__late = 0
+            self.__errors = 0
+            self.__last_error = None
+        else:
+            raise ValueError("The assets should be a dictionary and the size of the queue a positive integer")
+
+    @property
+    def ticks(self):
+        return self.__ticks
+
+    @property
+    def revaluations(self):
+        return self.__revaluations
+
+    @property
+    def last_error(self):
+        """
+        :return: The last exception raised while recording the ticks of an asset or revaluing its options, or None
+        """
+        return self.__last_error
+
+    def stats(self):
+        """
+        :return: Dictionary holding the counters of the ingestor
+        """
+        return {"ticks": self.__ticks, "batches": self.__batches, "revaluations": self.__revaluations,
+                "unknown": self.__unknown, "invalid": self.__invalid, "late": self.__late,
+                "errors": self.__errors}
+
+    async def __put(self, data):
+        ticks, invalid = parse_ticks(data, time.time_ns() // 1000)
+        self.__invalid += invalid
+        if ticks:
+            # Waits while the queue is full
+            await self.__queue.put(ticks)
+
+    def __record(self, batches):
+        # Grouping the ticks by asset, in the order they arrived
+        grouped = {}
+        for ticks in batches:
+            for name, price, timestamp in ticks:
+                prices, timestamps = grouped.setdefault(name, ([], []))
+                prices.append(price)
+                timestamps.append(timestamp)
+        for name, (prices, timestamps) in grouped.items():
+            asset = self.__assets.get(name)
+            if asset is None:
+                self.__unknown += len(prices)
+                continue
+            # Stable sort, the ticks of the same time stay in the order they arrived
+            order = sorted(range(len(prices)), key=timestamps.__getitem__)
+            last = asset.price_history.last_timestamp
+            kept = [i for i in order if last is None or timestamps[i] >= last]
+            self.__late += len(prices) - len(kept)
+            if not kept:
+                continue
+            prices = [prices[i] for i in kept]
+            timestamps = [timestamps[i] for i in kept]
+            # An error on one asset is counted and the consumer goes on, otherwise the feeds would wait forever on the
+            # full queue
+            try:
+                asset.update_prices(prices, timestamps)
+                self.__ticks += len(prices)
+                self.__revaluations += 1
+                if self.__on_revalue is not None:
+                    self.__on_revalue(asset, asset.dependents)
+            except Exception as e:
+                self.__errors += 1
+                self.__last_error = e
+        self.__batches += len(batches)
+
+    async def __consume(self):
+        while True:
+            batches = [await self.__queue.get()]
+            while not self.__queue.empty():
+                batches.append(self.__queue.get_nowait())
+            try:
+                self.__record(batches)
+            finally:
+                for i in batches:
+                    self.__queue.task_done()
+
+    async def read_stream(self, reader, block_size=65536):
+        """
+        Feeds the ticks read from an asyncio StreamReader until the end of the stream
+        :param reader: asyncio.StreamReader
+        :param block_size: Number of bytes read at once
+        :return:
+        """
+        rest = b""
+        while True:
+            data = await reader.read(block_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b"\n") + 1
+            rest = data[end:]
+            await self.__put(data[:end])
+        await self.__put(rest)
+
+    async def read_file(self, path, follow=False, poll_interval=0.1, block_size=65536):
+        """
+        Feeds the ticks of a file
+        :param path: Path of the file
+        :param follow: If True the end of the file is watched for new lines, like tail -f, until the task is cancelled
+        :param poll_interval: Time in seconds between two checks of the end of the file
+        :param block_size: Number of bytes read at once
+        :return:
+        """
+        rest = b""
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(block_size)
+                if not data:
+                    if not follow:
+                        break
+                    await asyncio.sleep(poll_interval)
+                    continue
+                data = rest + data
+                end = data.rfind(b"\n") + 1
+                rest = data[end:]
+                await self.__put(data[:end])
+                # Lets the other feeds and the consumer run
+                await asyncio.sleep(0)
+        await self.__put(rest)
+
+    async def serve(self, host="127.0.0.1", port=0):
+        """
+        Starts a TCP server, each connection is a feed of ticks
+        :param host: Address of the server
+        :param port: Port of the server, 0 for any free port
+        :return: The asyncio Server, its sockets give the port used
+        """
+        async def handle(reader, writer):
+            try:
+                await self.read_stream(reader)
+            finally:
+                writer.close()
+        return await asyncio.start_server(handle, host, port)
+
+    async def run(self, feeds):
+        """
+        Runs feeds until they are all finished and every tick is recorded
+        :param feeds: List of coroutines, for instance read_file(...) or the wait of a server
+        :return: The counters of the ingestor
+        """
+        self.start()
+        try:
+            await asyncio.gather(*feeds)
+            await self.__queue.join()
+        finally:
+            self.stop()
+        return self.stats()
+
+    def start(self):
+        """
+        Starts the consumer, it should be called from a running event loop
+        :return:
+        """
+        self.__queue = asyncio.Queue(maxsize=self.__queue_size)
+        self.__consumer = asyncio.ensure_future(self.__consume())
+
+    def stop(self):
+        self.__consumer.cancel()
+
+    async def drain(self):
+        """
+        Waits until every tick already fed is recorded
+        :return:
+        """
+        await self.__queue.join()
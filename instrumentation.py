@@ -0,0 +1,183 @@
+import cProfile
+import functools
+import json
+import pstats
+import time
+from contextlib import contextmanager
+import analytic
+import classes
+import lattice
+import montecarlo
+import scenarios
+import trinomial
+
+
+class Stats(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Number of calls and time spent in each stage of the pricing, per type of option when it is known
+        :param args:
+        :param kwargs:
+        """
+        self.__stages = {}
+        self.__running = set()
+        self.__profile = None
+
+    @property
+    def profile(self):
+        """
+        :return: The pstats.Stats of the cProfile run, if any
+        """
+        return self.__profile
+
+    @profile.setter
+    def profile(self, value):
+        self.__profile = value
+
+    def record(self, stage, option_type, seconds):
+        """
+        :param stage: Name of the stage
+        :param option_type: Name of the class of the option, or None
+        :param seconds: Time spent in the call
+        :return:
+        """
+        entry = self.__stages.get((stage, option_type))
+        if entry is None:
+            self.__stages[(stage, option_type)] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+    def wrap(self, function, stage, by_type=False):
+        """
+        Wraps a function so that its calls are recorded, the calls made inside a call of the same stage (such as
+        super().payoff()) are not recorded again
+        :param function: The function or method
+        :param stage: Name of the stage
+        :param by_type: If True the function is a method of an option and the calls are grouped by type of option
+        :return: The wrapped function
+        """
+        running = self.__running
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if stage in running:
+                return function(*args, **kwargs)
+            running.add(stage)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                running.discard(stage)
+                self.record(stage, type(args[0]).__name__ if by_type else None, time.perf_counter() - start)
+        wrapper.instrumented = function
+        return wrapper
+
+    def reset(self):
+        self.__stages.clear()
+
+    def to_dict(self):
+        """
+        :return: Dictionary {stage: {option type or "all": {"calls", "seconds", "max_seconds", "mean_seconds"}}}
+        """
+        result = {}
+        for (stage, option_type), (calls, seconds, max_seconds) in sorted(self.__stages.items(),
+                                                                          key=lambda item: (item[0][0],
+                                                                                            str(item[0][1]))):
+            result.setdefault(stage, {})[option_type or "all"] = {
+                "calls": calls, "seconds": seconds, "max_seconds": max_seconds, "mean_seconds": seconds / calls}
+        return result
+
+    def to_json(self, path=None):
+        """
+        :param path: Optional path of a file in which the JSON is written
+        :return: The JSON string
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def __str__(self):
+        lines = ["{:<24} {:<20} {:>10} {:>14} {:>14}".format("Stage", "Type", "Calls", "Total (s)", "Mean (s)")]
+        for stage, types in self.to_dict().items():
+            for option_type, entry in types.items():
+                lines.append("{:<24} {:<20} {:>10} {:>14.6f} {:>14.9f}".format(
+                    stage, option_type, entry["calls"], entry["seconds"], entry["mean_seconds"]))
+        return "\n".join(lines)
+
+
+# Functions instrumented by enable: (owner, attribute, stage, by type of option)
+# Only the functions looked up through their module or class are measured, the names imported elsewhere with
+# "from module import *" keep the original function
+TARGETS = [(lattice, "terminal_prices", "lattice_construction", False),
+           (lattice, "price_tree", "lattice_construction", False),
+           (lattice, "backward_induction", "backward_induction", False),
+           (lattice, "shared_lattice_price", "shared_lattice", False),
+           (trinomial, "trinomial_price", "trinomial", False),
+           (scenarios, "scenario_prices", "scenarios", False),
+           (montecarlo, "simulate_chunk", "monte_carlo_paths", False),
+           (analytic, "black_scholes", "analytic", False),
+           (analytic, "barrier_price", "analytic", False),
+           (classes.PriceHistory, "append", "history_append", False),
+           (classes.PriceHistory, "extend", "history_append", False),
+           (classes.BarrierOption, "Mt", "extrema", True),
+           (classes.BarrierOption, "mt", "extrema", True)]
+# Every payoff method of the option classes, grouped by type of option
+TARGETS += [(cls, "payoff", "payoff", True) for cls in vars(classes).values()
+            if isinstance(cls, type) and issubclass(cls, classes.Option) and "payoff" in vars(cls)]
+
+STATS = Stats()
+
+
+def enable(stats=None):
+    """
+    Starts the measures by replacing the targets by wrapped functions, nothing is measured (and nothing costs) before
+    :param stats: Stats in which the calls are recorded, the module STATS by default
+    :return: The Stats used
+    """
+    stats = STATS if stats is None else stats
+    disable()
+    for owner, name, stage, by_type in TARGETS:
+        setattr(owner, name, stats.wrap(vars(owner)[name], stage, by_type=by_type))
+    return stats
+
+
+def disable():
+    """
+    Puts the original functions back
+    :return:
+    """
+    for owner, name, stage, by_type in TARGETS:
+        function = vars(owner)[name]
+        if hasattr(function, "instrumented"):
+            setattr(owner, name, function.instrumented)
+
+
+def is_enabled():
+    return any(hasattr(vars(owner)[name], "instrumented") for owner, name, stage, by_type in TARGETS)
+
+
+@contextmanager
+def instrumented(profile=False, stats=None):
+    """
+    Measures the stages of the code run inside the with block
+    :param profile: If True cProfile runs as well, its pstats.Stats is then available in stats.profile
+    :param stats: Stats in which the calls are recorded, a new one by default
+    :return: The Stats
+    """
+    stats = Stats() if stats is None else stats
+    enable(stats)
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            stats.profile = pstats.Stats(profiler)
+        disable()
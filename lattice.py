@@ -0,0 +1,477 @@
+import math
+import time
+import numpy as np
+import analytic
+from classes import *
+
+
+def crr_parameters(rf, sigma, size_steps):
+    """
+    Computes the Cox-Ross-Rubinstein parameters of the binomial model
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param size_steps: Size of the steps in years
+    :return: (u, d, p) the up factor, the down factor and the risk neutral probability of an up move
+    """
+    u = math.exp(sigma * math.sqrt(size_steps))
+    d = 1 / u
+    p = (math.exp(rf * size_steps) - d) / (u - d)
+    if not 0 <= p <= 1:
+        raise ValueError("The risk neutral probability is outside [0, 1], the step size is too large")
+    return u, d, p
+
+
+def peizer_pratt(z, n):
+    """
+    Peizer-Pratt inversion (method 2) of the normal distribution by a binomial distribution of n steps
+    :param z: Quantile of the standard normal distribution
+    :param n: Number of steps, odd
+    :return: Probability of an up move
+    """
+    x = z / (n + 1 / 3 + 0.1 / (n + 1))
+    return 0.5 + math.copysign(0.5, z) * math.sqrt(1 - math.exp(-x * x * (n + 1 / 6)))
+
+
+def lr_parameters(spot, strike, rf, sigma, N, size_steps):
+    """
+    Computes the Leisen-Reimer parameters of the binomial model, the tree is centered on the strike so the price
+    converges in O(1/N^2) without oscillation
+    :param spot: Price of the underlying asset
+    :param strike: Strike price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps in the binomial tree, odd
+    :param size_steps: Size of the steps in years
+    :return: (u, d, p) the up factor, the down factor and the risk neutral probability of an up move
+    """
+    if N % 2 == 0:
+        raise ValueError("The Leisen-Reimer tree needs an odd number of steps")
+    T = N * size_steps
+    vol = sigma * math.sqrt(T)
+    d1 = (math.log(spot / strike) + (rf + 0.5 * sigma * sigma) * T) / vol
+    d2 = d1 - vol
+    p = peizer_pratt(d2, N)
+    growth = math.exp(rf * size_steps)
+    u = growth * peizer_pratt(d1, N) / p
+    d = (growth - p * u) / (1 - p)
+    return u, d, p
+
+
+# Schemes of binomial_price, the Richardson extrapolation is done in binomial_price itself
+SCHEMES = ["crr", "lr", "crr-richardson"]
+
+
+def check_lattice_option(option):
+    """
+    Checks that an option can be priced on a recombining tree, path dependent options can not
+    :param option: The option we want to price
+    :return:
+    """
+    if isinstance(option, (BarrierOption, LoopbackCall, LoopbackPut)):
+        raise ValueError("Path dependent options can not be priced on a recombining binomial tree")
+    if not isinstance(option, (CallOption, PutOption)):
+        raise ValueError("The option should be a call or a put")
+
+
+def terminal_prices(spot, u, d, N, out=None):
+    """
+    Computes the prices of the underlying at the last column of the tree
+    The index j of the array is the number of down moves, as in the tree built by binarymodel
+    :param spot: The actual price of the underlying asset
+    :param u: Up factor
+    :param d: Down factor
+    :param N: Number of steps in the binomial tree
+    :param out: Optional array of size N + 1 in which the prices are written
+    :return: Array of the N + 1 terminal prices
+    """
+    if out is None:
+        out = np.empty(N + 1)
+    # S * u^(N - j) * d^j computed through logs so that we do not loop in python
+    np.multiply(np.arange(N + 1), math.log(d) - math.log(u), out=out)
+    out += N * math.log(u)
+    np.exp(out, out=out)
+    out *= spot
+    return out
+
+
+def intrinsic_value(option, prices, out=None):
+    """
+    Computes the payoff of a call or a put for an array of prices of the underlying
+    :param option: The option we want to price
+    :param prices: Array of prices of the underlying
+    :param out: Optional array in which the payoffs are written, it can be prices itself
+    :return: Array of payoffs
+    """
+    if isinstance(option, PutOption):
+        out = np.subtract(option.strike, prices, out=out)
+    else:
+        out = np.subtract(prices, option.strike, out=out)
+    return np.maximum(out, 0, out=out)
+
+
+def rollback_step(values, scratch, i, up, down):
+    """
+    Computes the values of the column i - 1 of the tree from the values of the column i, in place
+    The last axis of values holds the nodes, so several options can be rolled back at once
+    :param values: Array whose first i + 1 nodes hold the values of the column i
+    :param scratch: Work buffer with the same leading shape as values and at least i nodes
+    :param i: Index of the column
+    :param up: Discounted probability of an up move
+    :param down: Discounted probability of a down move
+    :return:
+    """
+    # values[j] = up * values[j] + down * values[j + 1], for every node of column i - 1
+    np.multiply(values[..., 1:i + 1], down, out=scratch[..., :i])
+    np.multiply(values[..., :i], up, out=values[..., :i])
+    np.add(values[..., :i], scratch[..., :i], out=values[..., :i])
+
+
+def backward_induction(values, p, discount, N, scratch=None, tree=None, stop=0):
+    """
+    Rolls the values of the last column of the tree back to the root, the values array is modified in place
+    p and discount can also be arrays of shape (rows, 1) to roll back several trees stored in the rows of values
+    :param values: Array of size N + 1 holding the values at expiry
+    :param p: Risk neutral probability of an up move
+    :param discount: Discount factor for one step
+    :param N: Number of steps in the binomial tree
+    :param scratch: Optional array of size N used as a work buffer
+    :param tree: Optional (N + 1) x (N + 1) array in which the value of every node is stored
+    :param stop: Column at which the roll back stops, the root by default
+    :return: The value at the root of the tree, or at the first node of the column stop
+    """
+    if scratch is None:
+        scratch = np.empty(values.shape[:-1] + (max(N, 1),))
+    up = discount * p
+    down = discount * (1 - p)
+    if tree is not None:
+        tree[N, :N + 1] = values[:N + 1]
+    for i in range(N, stop, -1):
+        rollback_step(values, scratch, i, up, down)
+        if tree is not None:
+            tree[i - 1, :i] = values[:i]
+    return float(values[..., 0].flat[0])
+
+
+def price_tree(spot, u, d, N):
+    """
+    Builds the whole tree of the prices of the underlying, this uses O(N^2) memory
+    :param spot: The actual price of the underlying asset
+    :param u: Up factor
+    :param d: Down factor
+    :param N: Number of steps in the binomial tree
+    :return: (N + 1) x (N + 1) array, the row i holds the i + 1 prices at step i and NaN after
+    """
+    steps = np.arange(N + 1)[:, None]
+    downs = np.arange(N + 1)[None, :]
+    tree = spot * np.exp((steps - downs) * math.log(u) + downs * math.log(d))
+    tree[downs > steps] = np.nan
+    return tree
+
+
+def binomial_price(option, rf, sigma, N, size_steps, return_tree=False, scheme="crr"):
+    """
+    Prices a european call or put with the binomial model, using arrays of size N + 1 only
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps in the binomial tree
+    :param size_steps: Size of the steps in years
+    :param return_tree: If True the trees of prices and values are also returned, this uses O(N^2) memory
+    :param scheme: "crr" for the Cox-Ross-Rubinstein tree, "lr" for the Leisen-Reimer tree (N is rounded up to an
+    odd number of steps over the same maturity) or "crr-richardson" for the extrapolation 2 * P(2N) - P(N) of two
+    smoothed CRR trees, which cancels their O(1/N) error
+    :return: The price of the option, or [price, tree, valueTree] if return_tree is True
+    """
+    check_lattice_option(option)
+    if N < 1:
+        raise ValueError("The number of steps should be at least 1")
+    if scheme not in SCHEMES:
+        raise ValueError("Unknown lattice scheme, it should be one of {}".format(", ".join(SCHEMES)))
+    if scheme == "crr-richardson":
+        if return_tree:
+            raise ValueError("The extrapolated price has no tree")
+        steps = max(N, 2)
+        step = size_steps * N / steps
+        return (2 * smoothed_binomial_price(option, rf, sigma, 2 * steps, step / 2)
+                - smoothed_binomial_price(option, rf, sigma, steps, step))
+    spot = option.asset.actual_price
+    if scheme == "lr":
+        steps = N + 1 - N % 2
+        size_steps = size_steps * N / steps
+        N = steps
+        u, d, p = lr_parameters(spot, option.strike, rf, sigma, N, size_steps)
+    else:
+        u, d, p = crr_parameters(rf, sigma, size_steps)
+    discount = math.exp(-rf * size_steps)
+
+    # The terminal prices and the option values share the same buffer
+    values = terminal_prices(spot, u, d, N)
+    intrinsic_value(option, values, out=values)
+
+    if return_tree:
+        value_tree = np.full((N + 1, N + 1), np.nan)
+        price = backward_induction(values, p, discount, N, tree=value_tree)
+        return [price, price_tree(spot, u, d, N), value_tree]
+    return backward_induction(values, p, discount, N)
+
+
+def smoothed_binomial_price(option, rf, sigma, N, size_steps):
+    """
+    Prices a european call or put with a CRR tree whose last step is replaced by the Black-Scholes price, which
+    removes the oscillation of the CRR price with N so that its error can be extrapolated
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps in the binomial tree, at least 2
+    :param size_steps: Size of the steps in years
+    :return: The price of the option
+    """
+    u, d, p = crr_parameters(rf, sigma, size_steps)
+    values = terminal_prices(option.asset.actual_price, u, d, N - 1)
+    values = analytic.black_scholes(values, option.strike, size_steps, rf, sigma,
+                                    is_put=isinstance(option, PutOption))
+    return backward_induction(values, p, math.exp(-rf * size_steps), N - 1)
+
+
+def convergence_report(option, rf, sigma, T, steps=(25, 50, 100, 200, 400, 800, 1600), schemes=None,
+                       tolerance=1e-3):
+    """
+    Compares the convergence of the lattice schemes to the Black-Scholes price
+    :param option: European call or put
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param T: Time to maturity in years
+    :param steps: Numbers of steps tried, in increasing order
+    :param schemes: Schemes compared, every scheme of SCHEMES by default
+    :param tolerance: Absolute error a scheme should reach
+    :return: [reference price, {scheme: [[N, price, error, seconds] for each N]}, {scheme: smallest N whose error
+    and the errors of every larger N are below tolerance, or None}]
+    """
+    check_lattice_option(option)
+    reference = float(analytic.black_scholes(option.asset.actual_price, option.strike, T, rf, sigma,
+                                    is_put=isinstance(option, PutOption)))
+    rows = {}
+    needed = {}
+    for scheme in SCHEMES if schemes is None else schemes:
+        rows[scheme] = []
+        needed[scheme] = None
+        for N in steps:
+            start = time.perf_counter()
+            price = binomial_price(option, rf, sigma, N, T / N, scheme=scheme)
+            seconds = time.perf_counter() - start
+            error = price - reference
+            rows[scheme].append([N, price, error, seconds])
+            if abs(error) > tolerance:
+                needed[scheme] = None
+            elif needed[scheme] is None:
+                needed[scheme] = N
+    return [reference, rows, needed]
+
+
+def print_convergence_report(report, tolerance=1e-3):
+    """
+    Prints the result of convergence_report
+    :param report: [reference, rows, needed] given by convergence_report
+    :param tolerance: Tolerance used by convergence_report
+    :return:
+    """
+    reference, rows, needed = report
+    print("Black-Scholes price: {:.8f}".format(reference))
+    print("{:<16} {:>8} {:>14} {:>14} {:>12}".format("Scheme", "N", "Price", "Error", "Time (s)"))
+    for scheme, scheme_rows in rows.items():
+        for N, price, error, seconds in scheme_rows:
+            print("{:<16} {:>8} {:>14.8f} {:>14.2e} {:>12.6f}".format(scheme, N, price, error, seconds))
+    for scheme, N in needed.items():
+        print("{}: {} steps to stay within {:g}".format(scheme, N if N is not None else "more than the largest",
+                                                          tolerance))
+
+
+def option_steps(option, size_steps):
+    """
+    Number of steps of size size_steps needed to reach the maturity of an option
+    :param option: The option we want to price
+    :param size_steps: Size of the steps in years
+    :return: The number of steps, 0 if the option expires today
+    """
+    return int(round(option.days / 365 / size_steps))
+
+
+def shared_lattice_price(spot, strikes, is_put, steps, rf, sigma, size_steps):
+    """
+    Prices several european calls and puts on the same underlying with one tree
+    The options expiring earlier use the first columns of the tree of the longest option
+    :param spot: The actual price of the underlying asset
+    :param strikes: Array of strikes
+    :param is_put: Boolean array, True for puts and False for calls
+    :param steps: Array holding the number of steps until the maturity of each option
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param size_steps: Size of the steps in years
+    :return: Array of prices, in the order of strikes
+    """
+    strikes = np.asarray(strikes, dtype=float)
+    sign = np.where(is_put, -1.0, 1.0)
+    steps = np.asarray(steps, dtype=int)
+    if np.any(steps < 0):
+        raise ValueError("The number of steps should be positive")
+    u, d, p = crr_parameters(rf, sigma, size_steps)
+    discount = math.exp(-rf * size_steps)
+
+    # The rows are sorted by decreasing maturity so that the options alive at column i are always the first rows
+    order = np.argsort(-steps, kind="stable")
+    strikes, sign, steps = strikes[order], sign[order], steps[order]
+    N = int(steps[0])
+    values = np.zeros((len(strikes), N + 1))
+    scratch = np.empty((len(strikes), max(N, 1)))
+    column = np.empty(N + 1)
+    alive = 0
+    for i in range(N, -1, -1):
+        expiring = alive
+        while alive < len(steps) and steps[alive] == i:
+            alive += 1
+        if alive > expiring:
+            # The options expiring at column i start with their payoff
+            terminal_prices(spot, u, d, i, out=column[:i + 1])
+            payoff = values[expiring:alive, :i + 1]
+            np.subtract(column[:i + 1], strikes[expiring:alive, None], out=payoff)
+            payoff *= sign[expiring:alive, None]
+            np.maximum(payoff, 0, out=payoff)
+        if i > 0:
+            rollback_step(values[:alive], scratch[:alive], i, discount * p, discount * (1 - p))
+
+    prices = np.empty(len(strikes))
+    prices[order] = values[:, 0]
+    return prices
+
+
+def batch_price(options, rf, sigma, size_steps, steps=None):
+    """
+    Prices a list of european calls and puts, the options sharing the same asset and volatility share one tree
+    :param options: List of options
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility, either one value or one value per option
+    :param size_steps: Size of the steps in years
+    :param steps: Optional number of steps for each option, by default the maturity in days of the option is used
+    :return: Array of prices, in the order of options
+    """
+    options = list(options)
+    sigmas = np.broadcast_to(np.asarray(sigma, dtype=float), (len(options),))
+    if steps is None:
+        steps = [option_steps(option, size_steps) for option in options]
+    steps = np.broadcast_to(np.asarray(steps, dtype=int), (len(options),))
+
+    # Grouping the options by underlying and lattice parameters
+    groups = {}
+    for index, option in enumerate(options):
+        check_lattice_option(option)
+        groups.setdefault((option.asset, float(sigmas[index])), []).append(index)
+
+    prices = np.empty(len(options))
+    for (asset, group_sigma), indexes in groups.items():
+        indexes = np.array(indexes)
+        strikes = [options[index].strike for index in indexes]
+        is_put = [isinstance(options[index], PutOption) for index in indexes]
+        prices[indexes] = shared_lattice_price(asset.actual_price, strikes, is_put, steps[indexes], rf,
+                                               group_sigma, size_steps)
+    return prices
+
+
+class Greeks(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Price and sensitivities of an option
+        :param args:
+        :param kwargs: price, delta, gamma, theta (per year), vega (per unit of volatility), rho (per unit of rate)
+        """
+        self.__price = kwargs.get("price", None)
+        self.__delta = kwargs.get("delta", None)
+        self.__gamma = kwargs.get("gamma", None)
+        self.__theta = kwargs.get("theta", None)
+        self.__vega = kwargs.get("vega", None)
+        self.__rho = kwargs.get("rho", None)
+
+    @property
+    def price(self):
+        return self.__price
+
+    @property
+    def delta(self):
+        return self.__delta
+
+    @property
+    def gamma(self):
+        return self.__gamma
+
+    @property
+    def theta(self):
+        return self.__theta
+
+    @property
+    def vega(self):
+        return self.__vega
+
+    @property
+    def rho(self):
+        return self.__rho
+
+    def __str__(self):
+        return "Price: {price}\n\t" \
+               "Delta: {delta}\n\t" \
+               "Gamma: {gamma}\n\t" \
+               "Theta: {theta}\n\t" \
+               "Vega: {vega}\n\t" \
+               "Rho: {rho}\n\t".format(price=self.price, delta=self.delta, gamma=self.gamma, theta=self.theta,
+                                         vega=self.vega, rho=self.rho)
+
+
+def lattice_greeks(option, rf, sigma, N, size_steps, bump_sigma=1e-3, bump_rf=1e-4):
+    """
+    Computes the price and the greeks of a european call or put with one pass of the binomial model
+    Delta, gamma and theta are read on the first nodes of the tree. Vega and rho come from trees with bumped
+    volatility and rate which are rolled back together with the main tree, in the rows of the same buffers
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps in the binomial tree, at least 2
+    :param size_steps: Size of the steps in years
+    :param bump_sigma: Shift of the volatility used for vega
+    :param bump_rf: Shift of the rate used for rho
+    :return: Greeks
+    """
+    check_lattice_option(option)
+    if N < 2:
+        raise ValueError("The number of steps should be at least 2 to compute the greeks")
+    spot = option.asset.actual_price
+
+    # Rows: main tree, volatility up, volatility down, rate up, rate down
+    bumps = [(sigma, rf), (sigma + bump_sigma, rf), (sigma - bump_sigma, rf), (sigma, rf + bump_rf),
+             (sigma, rf - bump_rf)]
+    values = np.empty((len(bumps), N + 1))
+    scratch = np.empty((len(bumps), N))
+    p = np.empty((len(bumps), 1))
+    discount = np.empty((len(bumps), 1))
+    for row, (row_sigma, row_rf) in enumerate(bumps):
+        u, d, p[row, 0] = crr_parameters(row_rf, row_sigma, size_steps)
+        discount[row, 0] = math.exp(-row_rf * size_steps)
+        terminal_prices(spot, u, d, N, out=values[row])
+        intrinsic_value(option, values[row], out=values[row])
+    u, d = crr_parameters(rf, sigma, size_steps)[:2]
+
+    # Rolling back to the column 2, then 1, then 0 and keeping the nodes of the main tree
+    backward_induction(values, p, discount, N, scratch=scratch, stop=2)
+    column2 = values[0, :3].copy()
+    backward_induction(values, p, discount, 2, scratch=scratch, stop=1)
+    column1 = values[0, :2].copy()
+    backward_induction(values, p, discount, 1, scratch=scratch)
+    prices = values[:, 0]
+
+    delta = (column1[0] - column1[1]) / (spot * (u - d))
+    delta_up = (column2[0] - column2[1]) / (spot * (u * u - 1))
+    delta_down = (column2[1] - column2[2]) / (spot * (1 - d * d))
+    gamma = (delta_up - delta_down) / (0.5 * spot * (u * u - d * d))
+    # The middle node of the column 2 has the same price as the root, two steps later
+    theta = (column2[1] - prices[0]) / (2 * size_steps)
+    vega = (prices[1] - prices[2]) / (2 * bump_sigma)
+    rho = (prices[3] - prices[4]) / (2 * bump_rf)
+    return Greeks(price=float(prices[0]), delta=float(delta), gamma=float(gamma), theta=float(theta),
+                  vega=float(vega), rho=float(rho))
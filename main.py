@@ -1,5 +1,11 @@
-import math
+import sys
 from classes import *
+from lattice import *
+from portfolio import *
+from cache import *
+from batch import *
+from scenarios import *
+from snapshot import *
 
 
 def print_list(list):
@@ -13,51 +19,71 @@ def print_list(list):
     print("\n\n")
 
 
-def binarymodel(option, rf, sigma, N, size_steps):
+def binarymodel(option, rf, sigma, N, size_steps, return_tree=False, scheme="crr"):
     """
     Uses the binary model to price an option
     We chose to use one time step for each day, the number of time steps is the number of days until maturity
+    The pricing itself is done by lattice.binomial_price which only keeps one column of the tree in memory
     :param N: Number of steps in the binomial tree
     :param size_steps: Size of the steps in years
     :param option: The options we want to price
     :param rf: Risk-free interest rate
     :param sigma: Volatility
-    :return:
+    :param return_tree: If True the trees of prices and values are also returned
+    :param scheme: Lattice scheme, see lattice.SCHEMES
+    :return: The price of the option, or [price, tree, valueTree] if return_tree is True
     """
-    # First we calculate the model parameters
-    n = N
-    u = math.exp(sigma * math.sqrt(size_steps))
-    d = 1 / u
-    p = (math.exp(rf * size_steps) - d) / (u - d)
-    print("n={}, u={}, p={}, d={}".format(n, u, p, d))
-
-    # Creating an empty tree that we store as a bidimensional list
-    tree = [[None] * (n + 1) for i in range(n + 1)]
-
-    # Setting the first value at the actual price of our option (the underlying asset price)
-    tree[0][0] = option.asset.actual_price
-
-    for i in range(1, n + 1):
-        # Creating the tree
-        tree[i] = [el * u if el is not None else None for el in tree[0:i][i - 1]]
-        tree[i][i] = tree[i - 1][i - 1] * d
-
-    valueTree = [[0] * (n + 1) for i in range(n + 1)]
-    # Calculating the value at expiry
-    if isinstance(option, PutOption):
-        valueTree[-1] = [max(0, x - option.strike) if x is not None else None for x in tree[-1]]
+    # First we print the parameters of the tree of the chosen scheme
+    if scheme == "crr":
+        u, d, p = crr_parameters(rf, sigma, size_steps)
+        print("n={}, u={}, p={}, d={}".format(N, u, p, d))
+    elif scheme == "lr":
+        # binomial_price rounds N up to an odd number of steps over the same maturity
+        n = N + 1 - N % 2
+        u, d, p = lr_parameters(option.asset.actual_price, option.strike, rf, sigma, n, size_steps * N / n)
+        print("n={}, u={}, p={}, d={}".format(n, u, p, d))
     else:
-        valueTree[-1] = [max(0, option.strike - x) if x is not None else None for x in tree[-1]]
-    return [tree, valueTree]
+        print("n={}, scheme={}".format(N, scheme))
+
+    return binomial_price(option, rf, sigma, N, size_steps, return_tree=return_tree, scheme=scheme)
+
+
+def tree_method(option):
+    """
+    :param option: An option
+    :return: Name of the method used by option 5 of the menu for this option
+    """
+    if isinstance(option, (LoopbackCall, LoopbackPut)):
+        return "une simulation de Monte Carlo"
+    if isinstance(option, BarrierOption):
+        return "l'arbre trinomial aligné sur la barrière"
+    return "l'arbre binomial"
+
+
+def tree_price(option, rf, sigma, N, size_steps):
+    """
+    Prices an option for option 5 of the menu: calls and puts on the binomial tree, barrier options on the trinomial
+    tree aligned on the barrier and loopback options, which no tree can price, by Monte Carlo simulations
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps
+    :param size_steps: Size of the steps in years
+    :return: The price of the option
+    """
+    if isinstance(option, (LoopbackCall, LoopbackPut)):
+        return price_option(option, rf, sigma, N, size_steps, engine="montecarlo")
+    if isinstance(option, BarrierOption):
+        return price_option(option, rf, sigma, N, size_steps, engine="trinomial")
+    return binarymodel(option, rf, sigma, N, size_steps)
 
 
 def main():
-    list_option_type = ["Call", "Put", "Loopback Call", "Loopback Put", "Barrier Up and In Call",
-                        "Barrier Up and Out Call", "Barrier Down and In Call", "Barrier Down and Out Call",
-                        "Barrier Up and In Put", "Barrier Up and Out Put", "Barrier Down and In Put",
-                        "Barrier Down and Out Put"]
+    list_option_type = list(OPTION_TYPES)
     list_asset = []
     list_options = []
+    # The prices computed in option 5 are kept until the price of the asset changes
+    cache = PricingCache(pricer=tree_price)
     mychar = ""
     while mychar != "q":
         print("""
@@ -71,11 +97,15 @@ Veuillez effectuer un choix à l'aide de votre clavier !
 2/ Créer une option
 3/ Voir mon portefeuille
 4/ Modifier la valeur d'un asset (simulation d'un changement de prix a date actuelle)
-5/ Pricer une option en utilisation les arbres binomiaux
+5/ Pricer une option en utilisation les arbres (binomial, trinomial pour les barrières)
+6/ Pricer tout le portefeuille (en parallèle)
+7/ Stress test du portefeuille (grille de chocs spot x volatilité)
+8/ Sauvegarder le portefeuille
+9/ Charger un portefeuille
 q/ Quitter
 """)
         mychar = input("Choix: ")
-        if isinstance(mychar, (str)) and mychar in ["1", "2", "3", "4", "5", "q"]:
+        if isinstance(mychar, (str)) and mychar in ["1", "2", "3", "4", "5", "6", "7", "8", "9", "q"]:
             if mychar == "1":
                 print("\n### CREATION ASSET ###\n\n")
                 name = input("Veuillez saisir le nom de votre asset:\n")
@@ -103,7 +133,7 @@ q/ Quitter
                             print("### CHOIX TYPE OPTION ###")
                             print_list(list_option_type)
                             choice_type = int(input("Veuillez choisir un type d'option: "))
-                            if choice_type >= len(list_option_type) or choice < 0:
+                            if choice_type >= len(list_option_type) or choice_type < 0:
                                 # Wrong choice
                                 raise (ValueError)
                             else:
@@ -116,30 +146,11 @@ q/ Quitter
                                     # Checking if values are positive
                                     raise (ValueError())
 
-                                if choice_type == 0:
-                                    o = CallOption(asset=myasset, strike=strike, days=matur)
-                                elif choice_type == 1:
-                                    o = PutOption(asset=myasset, strike=strike, days=matur)
-                                elif choice_type == 2:
-                                    o = LoopbackCall(asset=myasset, strike=strike, days=matur)
-                                elif choice_type == 3:
-                                    o = LoopbackPut(asset=myasset, strike=strike, days=matur)
-                                elif choice_type == 4:
-                                    o = UpAndInCall(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 5:
-                                    o = UpAndOutCall(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 6:
-                                    o = DownAndInCall(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 7:
-                                    o = DownAndOutCall(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 8:
-                                    o = UpAndInPut(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 9:
-                                    o = UpAndOutPut(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 10:
-                                    o = DownAndInPut(asset=myasset, strike=strike, days=matur, barrier=barr)
-                                elif choice_type == 11:
-                                    o = DownAndOutPut(asset=myasset, strike=strike, days=matur, barrier=barr)
+                                option_type = OPTION_TYPES[list_option_type[choice_type]]
+                                kwargs = {"asset": myasset, "strike": strike, "days": matur}
+                                if issubclass(option_type, BarrierOption):
+                                    kwargs["barrier"] = barr
+                                o = option_type(**kwargs)
                             list_options.append(o)
                     except ValueError:
                         print("Veuillez saisir des valeurs valides")
@@ -173,7 +184,7 @@ q/ Quitter
                     print("Veuillez d'abord créer un asset")
             elif mychar == "5":
                 if len(list_options) > 0:
-                    print("\nPRICING D'OPTION AVEC ARBRES BINOMIAUX\n")
+                    print("\nPRICING D'OPTION AVEC ARBRES BINOMIAUX ET TRINOMIAUX\n")
                     print_list(list_options)
                     try:
                         choice = int(input("Veuillez choisir une option à pricer: "))
@@ -185,18 +196,73 @@ q/ Quitter
                             vol = float(input("Veuillez saisir une valeur pour la volatilité: "))
                             N = int(input("Veuillez saisir un nombre de steps (hauteur de l'arbre): "))
                             size_steps = float(input("Veuillez saisir une taille de pas (en année - 0.25 = 3 mois): "))
-                            [tree, valueTree] = binarymodel(o, 0, vol, N, size_steps)
-                            print("Voici l'arbre binomial correspondant a vos valeurs "
-                                  "et la derniere colonne de l'arbre corrigée (max(0, payoff)): "
-                                  "{tree}\n{valueTree}\n".format(
-                                tree=tree, valueTree = valueTree[-1]
+                            price = cache.price(o, 0, vol, N, size_steps)
+                            print("Voici le prix de l'option obtenu avec {method}: {price}\n{cache}\n".format(
+                                method=tree_method(o), price=price, cache=cache
                             ))
                     except ValueError:
                         print("Veuillez saisir des valeurs correctes")
                 else:
                     print("Veuillez d'abord créer une option")
+            elif mychar == "6":
+                if len(list_options) > 0:
+                    print("\nPRICING DU PORTEFEUILLE\n")
+                    try:
+                        vol = float(input("Veuillez saisir une valeur pour la volatilité: "))
+                        size_steps = float(input("Veuillez saisir une taille de pas (en année - 1/365 = 1 jour): "))
+                        workers = int(input("Veuillez saisir un nombre de processus: "))
+                        results = price_portfolio(list_options, 0, vol, size_steps, workers=workers)
+                        for index, [price, duration] in enumerate(results):
+                            print("{ind}/ Prix: {price} (calculé en {duration:.4f}s)".format(ind=index, price=price,
+                                                                                         duration=duration))
+                    except ValueError:
+                        print("Veuillez saisir des valeurs correctes")
+                else:
+                    print("Veuillez d'abord créer une option")
+            elif mychar == "7":
+                if len(list_options) > 0:
+                    print("\nSTRESS TEST DU PORTEFEUILLE\n")
+                    try:
+                        vol = float(input("Veuillez saisir une valeur pour la volatilité: "))
+                        size_steps = float(input("Veuillez saisir une taille de pas (en année - 1/365 = 1 jour): "))
+                        spot_shocks = [float(x) for x in input(
+                            "Veuillez saisir les chocs de spot séparés par des virgules (0.1 = +10%): ").split(",")]
+                        vol_shocks = [float(x) for x in input(
+                            "Veuillez saisir les chocs de volatilité séparés par des virgules (0.05 = +5 points): "
+                        ).split(",")]
+                        pnl, base = scenario_pnl(list_options, 0, vol, size_steps, spot_shocks, vol_shocks)
+                        # P&L of the whole portfolio for each scenario
+                        total = pnl.sum(axis=2)
+                        print("{:>12}".format("spot \\ vol") + "".join("{:>14}".format(v) for v in vol_shocks))
+                        for index, shock in enumerate(spot_shocks):
+                            print("{:>12}".format(shock) + "".join("{:>14.4f}".format(x) for x in total[index]))
+                    except ValueError:
+                        print("Veuillez saisir des valeurs correctes")
+                else:
+                    print("Veuillez d'abord créer une option")
+            elif mychar == "8":
+                path = input("Veuillez saisir le dossier de sauvegarde: ")
+                try:
+                    save_snapshot(path, list_asset, list_options)
+                    print("Portefeuille sauvegardé dans {}".format(path))
+                except OSError:
+                    print("Impossible d'écrire dans ce dossier")
+            elif mychar == "9":
+                path = input("Veuillez saisir le dossier du portefeuille: ")
+                try:
+                    list_asset, book = load_snapshot(path)
+                    list_options = book.to_options()
+                    print("{assets} assets et {options} options chargés".format(assets=len(list_asset),
+                                                                             options=len(list_options)))
+                except (OSError, ValueError):
+                    print("Impossible de charger ce portefeuille")
         else:
             print("Veuillez saisir un caractère valide")
 
 
-main()
+if __name__ == "__main__":
+    # With arguments the book is priced in batch mode, otherwise the menu is started
+    if len(sys.argv) > 1:
+        batch_main(sys.argv[1:])
+    else:
+        main()
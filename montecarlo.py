@@ -0,0 +1,94 @@
+import math
+import numpy as np
+from classes import *
+
+
+def simulate_chunk(spot, rf, sigma, N, size_steps, n_paths, rng, antithetic=True, Mt=None, mt=None):
+    """
+    Simulates a chunk of geometric brownian motion paths, one time step at a time
+    Only the last price and the running maximum and minimum of each path are kept, so the memory used is O(n_paths)
+    :param spot: The actual price of the underlying asset
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of time steps until maturity
+    :param size_steps: Size of the steps in years
+    :param n_paths: Number of paths of the chunk, it should be even when antithetic is True
+    :param rng: numpy random Generator
+    :param antithetic: If True the second half of the paths uses the opposite shocks of the first half
+    :param Mt: Maximum already reached by the asset, the running maximum starts from it
+    :param mt: Minimum already reached by the asset, the running minimum starts from it
+    :return: [prices, Mt, mt] arrays of size n_paths
+    """
+    drift = (rf - 0.5 * sigma ** 2) * size_steps
+    vol = sigma * math.sqrt(size_steps)
+    half = n_paths // 2 if antithetic else n_paths
+
+    log_prices = np.full(n_paths, math.log(spot))
+    running_max = np.full(n_paths, spot if Mt is None else max(Mt, spot))
+    running_min = np.full(n_paths, spot if mt is None else min(mt, spot))
+    prices = np.empty(n_paths)
+    shocks = np.empty(n_paths)
+    for i in range(N):
+        rng.standard_normal(out=shocks[:half])
+        if antithetic:
+            np.negative(shocks[:half], out=shocks[half:])
+        shocks *= vol
+        shocks += drift
+        log_prices += shocks
+        np.exp(log_prices, out=prices)
+        np.maximum(running_max, prices, out=running_max)
+        np.minimum(running_min, prices, out=running_min)
+    if N == 0:
+        prices[:] = spot
+    return [prices, running_max, running_min]
+
+
+def monte_carlo_price(option, rf, sigma, N, size_steps, n_paths=100000, chunk_size=50000, antithetic=True,
+                      seed=None):
+    """
+    Prices an option with Monte Carlo simulations, the payoff is given by the simulated_payoff method of the option
+    so that barrier and loopback options are priced with the maximum and minimum of each path
+    The barrier is monitored at each time step and the maximum and minimum start from the price history of the asset
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of time steps until maturity
+    :param size_steps: Size of the steps in years
+    :param n_paths: Total number of simulated paths
+    :param chunk_size: Number of paths simulated at once, it bounds the memory used
+    :param antithetic: If True antithetic variates are used
+    :param seed: Seed of the random generator
+    :return: [price, standard error]
+    """
+    if n_paths < 2 or chunk_size < 2:
+        raise ValueError("The number of paths and the size of the chunks should be at least 2")
+    if antithetic:
+        # Both halves of a chunk have the same size
+        chunk_size -= chunk_size % 2
+    rng = np.random.default_rng(seed)
+    spot = option.asset.actual_price
+    Mt, mt = option.asset.price_history.max, option.asset.price_history.min
+
+    total = 0.0
+    total_squares = 0.0
+    n_samples = 0
+    remaining = n_paths
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        if antithetic:
+            size += size % 2
+        prices, running_max, running_min = simulate_chunk(spot, rf, sigma, N, size_steps, size, rng,
+                                                          antithetic=antithetic, Mt=Mt, mt=mt)
+        payoffs = option.simulated_payoff(prices, running_max, running_min)
+        if antithetic:
+            # The two payoffs of an antithetic pair are averaged to get independent samples
+            payoffs = 0.5 * (payoffs[:size // 2] + payoffs[size // 2:])
+        total += payoffs.sum()
+        total_squares += np.dot(payoffs, payoffs)
+        n_samples += len(payoffs)
+        remaining -= size
+
+    discount = math.exp(-rf * N * size_steps)
+    mean = total / n_samples
+    variance = max(total_squares / n_samples - mean ** 2, 0) * n_samples / max(n_samples - 1, 1)
+    return [float(discount * mean), discount * math.sqrt(variance / n_samples)]
@@ -0,0 +1,96 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from classes import *
+from lattice import *
+from montecarlo import *
+from analytic import *
+from trinomial import *
+
+
+def price_option(option, rf, sigma, N, size_steps, engine=None):
+    """
+    Prices one option with the engine suited to its type
+    By default the closed formulas are used for calls, puts and barrier options and Monte Carlo simulations for
+    loopback options
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps until maturity, 0 if the option expires today
+    :param size_steps: Size of the steps in years
+    :param engine: "analytic", "lattice", "trinomial" or "montecarlo" to force an engine, the trinomial engine
+    prices calls, puts and barrier options on a tree aligned on the barrier
+    :return: The price of the option
+    """
+    if N == 0:
+        return option.payoff()
+    if engine is None:
+        engine = "analytic" if has_closed_form(option) else "montecarlo"
+    if engine == "analytic":
+        return float(analytic_prices([option], rf, sigma, T=N * size_steps)[0])
+    if engine == "lattice":
+        return binomial_price(option, rf, sigma, N, size_steps)
+    if engine == "trinomial":
+        return trinomial_barrier_price(option, rf, sigma, N, size_steps)
+    if engine == "montecarlo":
+        return monte_carlo_price(option, rf, sigma, N, size_steps)[0]
+    raise ValueError("Unknown pricing engine {}".format(engine))
+
+
+def price_chunk(jobs):
+    """
+    Prices a list of jobs in the current process, this is the function run by the workers of the pool
+    :param jobs: List of [option, rf, sigma, N, size_steps] or [option, rf, sigma, N, size_steps, engine]
+    :return: List of [price, time spent in seconds]
+    """
+    results = []
+    for job in jobs:
+        start = time.perf_counter()
+        price = price_option(*job)
+        results.append([price, time.perf_counter() - start])
+    return results
+
+
+def price_portfolio(options, rf, sigma, size_steps, N=None, workers=None, chunk_size=None, min_parallel=64,
+                    engine=None):
+    """
+    Prices a list of options over a pool of processes
+    The options are sent to the workers by chunks, so that an asset shared by the options of a chunk is only pickled once
+    The workers get the options written on a summary of their asset, without its price history, see Asset.summary
+    :param options: List of options
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param size_steps: Size of the steps in years
+    :param N: Optional number of steps for every option, by default the maturity in days of each option is used
+    :param workers: Number of processes, by default the number of cores
+    :param chunk_size: Number of options sent at once to a worker, by default the options are split in 4 chunks per worker
+    :param min_parallel: Below this number of options the pricing is done in the current process
+    :param engine: Optional engine used for every option, see price_option
+    :return: List of [price, time spent in seconds], in the order of options
+    """
+    jobs = [[option, rf, sigma, option_steps(option, size_steps) if N is None else N, size_steps, engine]
+            for option in options]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("The number of workers should be at least 1")
+    if workers == 1 or len(jobs) < min_parallel:
+        return price_chunk(jobs)
+
+    # Only the actual price and the extrema of the histories are sent to the workers, a history can hold millions of
+    # prices or be a memory mapped file that pickling would copy
+    summaries = {}
+    for job in jobs:
+        asset = job[0].asset
+        if id(asset) not in summaries:
+            summaries[id(asset)] = asset.summary()
+        job[0] = job[0].copy_on(summaries[id(asset)])
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(jobs) // (4 * workers)))
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map gives the results back in the order of the chunks
+        for chunk_results in executor.map(price_chunk, chunks):
+            results.extend(chunk_results)
+    return results
@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from classes import *
+from book import OptionBook
+import scenarios
+from scenarios import book_columns
+
+
+def log_returns(prices, horizon=1):
+    """
+    :param prices: Array of prices, oldest first
+    :param horizon: Number of ticks over which each return is taken, the returns overlap when horizon > 1
+    :return: Array of the log returns log(prices[i + horizon] / prices[i])
+    """
+    logs = np.log(np.asarray(prices, dtype=float))
+    if len(logs) <= horizon:
+        return np.empty(0)
+    return logs[horizon:] - logs[:-horizon]
+
+
+def historical_returns(assets, horizon=1, window=None):
+    """
+    Matrix of the historical log returns of several assets
+    The histories are aligned on their last tick: scenario i holds the i-th most recent return of every asset, so the
+    ticks of the assets should be synchronous (daily closes for instance)
+    :param assets: List of assets
+    :param horizon: Number of ticks over which each return is taken
+    :param window: Maximum number of scenarios, the most recent ones, by default every return the shortest history has
+    :return: Array (scenarios, assets) of log returns, oldest first
+    """
+    if horizon < 1:
+        raise ValueError("The horizon should be at least 1")
+    returns = []
+    for asset in assets:
+        prices = asset.price_history.prices
+        if window is not None:
+            prices = prices[-(window + horizon):]
+        returns.append(log_returns(prices, horizon))
+    count = min(len(r) for r in returns) if returns else 0
+    if count == 0:
+        raise ValueError("The price histories are too short to compute returns over the horizon")
+    return np.stack([r[len(r) - count:] for r in returns], axis=1)
+
+
+def historical_pnl(columns, returns, rf, size_steps, base, positions, engine=None, n_paths=20000, seed=0,
+                   block_size=None):
+    """
+    P&L of a book under historical returns in the current process, this is the function run by the workers of the pool
+    The scenarios are priced by blocks with the vectorized pricers of scenarios.py
+    :param columns: Dictionary given by scenarios.book_columns
+    :param returns: Array (scenarios, assets) of log returns
+    :param rf: Risk-free interest rate
+    :param size_steps: Size of the steps in years
+    :param base: Array of the prices of the options without shock
+    :param positions: Array of the quantity held of each option
+    :param engine: See scenarios.scenario_prices
+    :param n_paths: Number of paths of the Monte Carlo simulations of the loopback options, even
+    :param seed: Seed of the random generator
+    :param block_size: Number of scenarios priced at once, by default about 4 million prices are computed at once
+    :return: Array of the P&L of the book in each scenario
+    """
+    if block_size is None:
+        block_size = max(1, 4000000 // len(base))
+    sigmas = columns["sigma"][None]
+    # The paths of the loopback options are simulated once and used by every block
+    paths = {}
+    pnl = np.empty(len(returns))
+    for start in range(0, len(returns), block_size):
+        block = returns[start:start + block_size]
+        spots = columns["spots"] * np.exp(block[:, columns["asset_indexes"]])
+        prices = scenarios.scenario_prices(columns, spots, sigmas, rf, size_steps, engine, n_paths, seed,
+                                           paths=paths)[:, 0]
+        pnl[start:start + len(block)] = (prices - base) @ positions
+    return pnl
+
+
+def historical_var(options, rf, sigma, size_steps, levels=(0.95, 0.99), horizon=1, window=None, positions=None,
+                   engine=None, n_paths=20000, seed=0, block_size=None, workers=None, min_parallel=1000000):
+    """
+    Historical-simulation value at risk and expected shortfall of a book of options
+    Each historical return of the assets is applied as a shock to their actual price and the whole book is revalued,
+    the scenarios are split between a pool of processes. The maturities and volatilities are left unchanged
+    :param options: List of options or OptionBook
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility, either one value or one value per option
+    :param size_steps: Size of the steps in years
+    :param levels: Confidence levels
+    :param horizon: Number of ticks over which the returns are taken
+    :param window: Maximum number of scenarios, the most recent ones
+    :param positions: Optional quantity held of each option, 1 by default
+    :param engine: See scenarios.scenario_prices
+    :param n_paths: Number of paths of the Monte Carlo simulations of the loopback options
+    :param seed: Seed of the random generator, every scenario uses the same random numbers
+    :param block_size: Number of scenarios priced at once, see historical_pnl
+    :param workers: Number of processes, by default the number of cores
+    :param min_parallel: Below this number of prices (scenarios times options) the pricing is done in the current process
+    :return: Dictionary {"value": value of the book, "pnl": array of the P&L of each scenario, "var": {level: VaR},
+    "es": {level: expected shortfall}}, the VaR and the expected shortfall are positive for a loss
+    """
+    book = options if isinstance(options, OptionBook) else OptionBook.from_options(options)
+    if len(book) == 0:
+        raise ValueError("The book is empty")
+    columns = book_columns(book, sigma, size_steps)
+    positions = np.ones(len(book)) if positions is None else np.asarray(positions, dtype=float)
+    if positions.shape != (len(book),):
+        raise ValueError("There should be one position per option")
+    returns = historical_returns(book.assets, horizon=horizon, window=window)
+    n_paths += n_paths % 2
+    base = scenarios.scenario_prices(columns, columns["spots"][None], columns["sigma"][None], rf, size_steps, engine,
+                                     n_paths, seed)[0, 0]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("The number of workers should be at least 1")
+    if workers == 1 or len(returns) < 2 or len(returns) * len(book) < min_parallel:
+        pnl = historical_pnl(columns, returns, rf, size_steps, base, positions, engine, n_paths, seed, block_size)
+    else:
+        chunks = np.array_split(returns, min(workers, len(returns)))
+        count = len(chunks)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pnl = np.concatenate(list(executor.map(
+                historical_pnl, [columns] * count, chunks, [rf] * count, [size_steps] * count, [base] * count,
+                [positions] * count, [engine] * count, [n_paths] * count, [seed] * count, [block_size] * count)))
+
+    var = {}
+    es = {}
+    for level in levels:
+        if not 0 < level < 1:
+            raise ValueError("The confidence levels should be in (0, 1)")
+        quantile = np.quantile(pnl, 1 - level)
+        var[level] = float(-quantile)
+        es[level] = float(-pnl[pnl <= quantile].mean())
+    return {"value": float(base @ positions), "pnl": pnl, "var": var, "es": es}
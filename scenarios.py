@@ -0,0 +1,270 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from classes import *
+import analytic
+import lattice
+import montecarlo
+import trinomial
+from book import *
+
+
+def book_columns(book, sigma, size_steps):
+    """
+    Gathers everything needed to price the options of a book under scenarios, one array per field so that the
+    columns are cheap to send to other processes
+    :param book: OptionBook
+    :param sigma: Volatility, either one value or one value per option
+    :param size_steps: Size of the steps in years
+    :return: Dictionary of arrays of one value per option
+    """
+    assets = book.assets
+    indexes = book.asset_indexes
+    steps = np.rint(book.days / 365 / size_steps).astype(int)
+    return {"types": book.types.copy(), "strikes": book.strikes.copy(), "barriers": book.barriers.copy(),
+            "steps": steps, "asset_indexes": indexes.copy(),
+            "spots": np.array([asset.actual_price for asset in assets], dtype=float)[indexes],
+            "Mt": np.array([asset.price_history.max for asset in assets], dtype=float)[indexes],
+            "mt": np.array([asset.price_history.min for asset in assets], dtype=float)[indexes],
+            "sigma": np.array(np.broadcast_to(np.asarray(sigma, dtype=float), (len(book),)))}
+
+
+def closed_form_prices(columns, selected, spots, sigmas, rf, size_steps, active):
+    """
+    Prices calls, puts and barrier options under every scenario with the closed formulas
+    :param columns: Dictionary given by book_columns
+    :param selected: Indexes of the options priced
+    :param spots: Array (spot scenarios, options) of shocked spots
+    :param sigmas: Array (volatility scenarios, options) of shocked volatilities
+    :param rf: Risk-free interest rate
+    :param size_steps: Size of the steps in years
+    :param active: Boolean array (spot scenarios, options) given by barrier_active
+    :return: Array (spot scenarios, volatility scenarios, selected options) of prices
+    """
+    types = columns["types"][selected]
+    strikes = columns["strikes"][selected]
+    T = columns["steps"][selected] * size_steps
+    is_put = IS_PUT[types]
+    spot = spots[:, None, selected]
+    sigma = sigmas[None, :, selected]
+    prices = analytic.black_scholes(spot, strikes, T, rf, sigma, is_put)
+
+    barrier = np.flatnonzero(IS_BARRIER[types])
+    if len(barrier):
+        is_in = IS_IN[types[barrier]]
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            alive = analytic.barrier_price(spot[..., barrier], strikes[barrier], columns["barriers"][selected][barrier],
+                                           T[barrier], rf, sigma[..., barrier], is_put[barrier], ~IS_UP[types[barrier]],
+                                           is_in)
+        vanilla = prices[..., barrier]
+        # Knock out options still alive and knock in options not knocked in yet, at maturity they are worth their payoff
+        pending = active[:, None, selected[barrier]] != is_in
+        alive = np.where(T[barrier] > 0, alive, np.where(is_in, 0.0, vanilla))
+        prices[..., barrier] = np.where(pending, alive, np.where(is_in, vanilla, 0.0))
+    return prices
+
+
+def lattice_prices(columns, selected, spots, sigmas, rf, size_steps, active):
+    """
+    Prices calls, puts and barrier options under every scenario on trees, the calls and puts on the same asset with
+    the same volatility share one binomial tree per scenario, the barrier options use the trinomial tree
+    Same parameters and result as closed_form_prices
+    """
+    types = columns["types"][selected]
+    strikes = columns["strikes"][selected]
+    steps = columns["steps"][selected]
+    is_put = IS_PUT[types]
+    prices = np.empty((len(spots), len(sigmas), len(selected)))
+
+    vanilla = np.flatnonzero(~IS_BARRIER[types])
+    groups = {}
+    for position in vanilla:
+        key = (columns["asset_indexes"][selected[position]], columns["sigma"][selected[position]])
+        groups.setdefault(key, []).append(position)
+    for positions in groups.values():
+        positions = np.array(positions)
+        option = selected[positions[0]]
+        for s, v in np.ndindex(len(spots), len(sigmas)):
+            prices[s, v, positions] = lattice.shared_lattice_price(spots[s, option], strikes[positions],
+                                                                   is_put[positions], steps[positions], rf,
+                                                                   sigmas[v, option], size_steps)
+
+    for position in np.flatnonzero(IS_BARRIER[types]):
+        option = selected[position]
+        is_in = bool(IS_IN[types[position]])
+        for s, v in np.ndindex(len(spots), len(sigmas)):
+            spot = spots[s, option]
+            pending = active[s, option] != is_in
+            if steps[position] == 0:
+                payoff = max(spot - strikes[position], 0) if not is_put[position] else max(strikes[position] - spot, 0)
+                prices[s, v, position] = payoff if active[s, option] else 0.0
+            elif pending or is_in:
+                prices[s, v, position] = trinomial.trinomial_price(
+                    spot, strikes[position], steps[position] * size_steps, rf, sigmas[v, option], steps[position],
+                    is_put=bool(is_put[position]), barrier=columns["barriers"][option] if pending else None,
+                    is_down=not IS_UP[types[position]], is_in=is_in)
+            else:
+                prices[s, v, position] = 0.0
+    return prices
+
+
+def path_extrema(rf, sigma, N, size_steps, n_paths, seed):
+    """
+    Simulates paths starting from 1 and sorts their maximum and minimum, with the cumulated sums needed by
+    loopback_prices
+    :return: [sorted maxima, sums of the largest maxima, sorted minima, sums of the smallest minima], the sums have
+    n_paths + 1 values and start with 0
+    """
+    rng = np.random.default_rng(seed)
+    running_max, running_min = montecarlo.simulate_chunk(1.0, rf, sigma, N, size_steps, n_paths, rng)[1:]
+    running_max.sort()
+    running_min.sort()
+    return [running_max, np.concatenate(([0.0], np.cumsum(running_max[::-1]))), running_min,
+            np.concatenate(([0.0], np.cumsum(running_min)))]
+
+
+def loopback_prices(columns, selected, spots, sigmas, rf, size_steps, n_paths, seed, paths=None):
+    """
+    Prices loopback options under every scenario with Monte Carlo simulations
+    The paths are simulated once per asset, maturity and volatility, with a spot of 1, and scaled by the shocked spot
+    of each scenario, so every scenario uses the same random numbers and the P&L is not blurred by noise. The mean
+    payoff of a scenario is read on the sorted extrema of the paths with a binary search, which gives the same result
+    as averaging the payoffs of every path
+    Same parameters and result as closed_form_prices, plus the number of paths, the seed of the random generator and
+    an optional dictionary in which the simulated paths are kept from one call to the next
+    """
+    types = columns["types"][selected]
+    steps = columns["steps"][selected]
+    prices = np.empty((len(spots), len(sigmas), len(selected)))
+    paths = {} if paths is None else paths
+    groups = {}
+    for position, option in enumerate(selected):
+        key = (columns["asset_indexes"][option], steps[position], columns["sigma"][option])
+        groups.setdefault(key, []).append(position)
+    for (asset_index, N, sigma), positions in groups.items():
+        positions = np.array(positions)
+        options = selected[positions]
+        is_put = IS_PUT[types[positions]]
+        # With a spot S, the payoff is S * max(max(a, X) - b, 0) for a call and S * max(b - min(a, X), 0) for a put,
+        # where X is the extremum of a path starting from 1, a the extremum of the history over S and b the strike over S
+        spot = spots[:, options]
+        b = columns["strikes"][options] / spot
+        a = np.where(is_put, columns["mt"][options], columns["Mt"][options]) / spot
+        discount = math.exp(-rf * N * size_steps)
+        for v in range(len(sigmas)):
+            key = (asset_index, N, sigmas[v, options[0]], n_paths, seed)
+            if key not in paths:
+                paths[key] = path_extrema(rf, sigmas[v, options[0]], N, size_steps, n_paths, seed)
+            maxima, largest, minima, smallest = paths[key]
+
+            # Calls: E[max(a, X)] - b when a >= b, E[(X - b)+] otherwise
+            c = np.where(is_put, 0.0, np.maximum(a, b))
+            above = n_paths - np.searchsorted(maxima, c, side="right")
+            tail = largest[above]
+            call = np.where(a >= b, c * (n_paths - above) + tail - b * n_paths, tail - b * above)
+            # Puts: b - E[min(a, X)] when a <= b, E[(b - X)+] otherwise
+            c = np.where(is_put, np.minimum(a, b), 0.0)
+            below = np.searchsorted(minima, c, side="left")
+            head = smallest[below]
+            put = np.where(a <= b, b * n_paths - c * (n_paths - below) - head, b * below - head)
+            prices[:, v, positions] = discount * spot * np.maximum(np.where(is_put, put, call), 0) / n_paths
+    return prices
+
+
+def scenario_prices(columns, spots, sigmas, rf, size_steps, engine=None, n_paths=20000, seed=0, paths=None):
+    """
+    Prices every option of the columns for every shocked spot and every shocked volatility
+    :param columns: Dictionary given by book_columns
+    :param spots: Array (spot scenarios, options) of shocked spots, each option can have its own shock
+    :param sigmas: Array (volatility scenarios, options) of shocked volatilities
+    :param rf: Risk-free interest rate
+    :param size_steps: Size of the steps in years
+    :param engine: None or "analytic" for the closed formulas, "lattice" for the binomial and trinomial trees, the
+    loopback options are always priced with Monte Carlo simulations
+    :param n_paths: Number of paths of the Monte Carlo simulations, even
+    :param seed: Seed of the random generator
+    :param paths: Optional dictionary in which the simulated paths are kept, see loopback_prices
+    :return: Array (spot scenarios, volatility scenarios, options) of prices
+    """
+    if engine not in (None, "analytic", "lattice"):
+        raise ValueError("Unknown scenario engine {}".format(engine))
+    if np.any(spots <= 0) or np.any(sigmas <= 0):
+        raise ValueError("The shocked spots and volatilities should be positive")
+    types = columns["types"]
+    # A shock is an instant move of the spot, the barriers it crosses are hit
+    active = barrier_active(types, columns["barriers"], np.maximum(columns["Mt"], spots),
+                            np.minimum(columns["mt"], spots))
+
+    prices = np.empty((len(spots), len(sigmas), len(types)))
+    loopback = np.flatnonzero(IS_LOOPBACK[types])
+    others = np.flatnonzero(~IS_LOOPBACK[types])
+    if len(others):
+        pricer = lattice_prices if engine == "lattice" else closed_form_prices
+        prices[..., others] = pricer(columns, others, spots, sigmas, rf, size_steps, active)
+    if len(loopback):
+        prices[..., loopback] = loopback_prices(columns, loopback, spots, sigmas, rf, size_steps, n_paths, seed,
+                                                  paths=paths)
+    return prices
+
+
+def scenario_chunk(columns, spot_shocks, vol_shocks, rf, size_steps, engine=None, n_paths=20000, seed=0):
+    """
+    Prices every option of the columns under a grid of scenarios in the current process, this is the function run by
+    the workers of the pool
+    :param columns: Dictionary given by book_columns
+    :param spot_shocks: Array of relative shocks of the spots, 0.1 is a rise of 10%
+    :param vol_shocks: Array of absolute shocks of the volatilities, 0.05 adds 5 points of volatility
+    :param rf: Risk-free interest rate
+    :param size_steps: Size of the steps in years
+    :param engine: See scenario_prices
+    :param n_paths: Number of paths of the Monte Carlo simulations, even
+    :param seed: Seed of the random generator
+    :return: Array (spot shocks, volatility shocks, options) of prices
+    """
+    spot_shocks = np.asarray(spot_shocks, dtype=float)
+    vol_shocks = np.asarray(vol_shocks, dtype=float)
+    return scenario_prices(columns, columns["spots"] * (1 + spot_shocks[:, None]),
+                           columns["sigma"] + vol_shocks[:, None], rf, size_steps, engine, n_paths, seed)
+
+
+def scenario_pnl(options, rf, sigma, size_steps, spot_shocks, vol_shocks, engine=None, workers=None, min_parallel=2000,
+                 n_paths=20000, seed=0):
+    """
+    Reprices a book under every couple (spot shock, volatility shock) of a grid
+    The spot shocks are split between a pool of processes, each one prices its scenarios with vectorized formulas or
+    shared trees
+    :param options: List of options or OptionBook
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility, either one value or one value per option
+    :param size_steps: Size of the steps in years
+    :param spot_shocks: Relative shocks of the spots, 0.1 is a rise of 10%
+    :param vol_shocks: Absolute shocks of the volatilities, 0.05 adds 5 points of volatility
+    :param engine: None or "analytic" for the closed formulas, "lattice" for the trees, see scenario_chunk
+    :param workers: Number of processes, by default the number of cores
+    :param min_parallel: Below this number of prices (scenarios times options) the pricing is done in the current process
+    :param n_paths: Number of paths of the Monte Carlo simulations of the loopback options
+    :param seed: Seed of the random generator, every scenario uses the same random numbers
+    :return: [P&L cube (spot shocks, volatility shocks, options), prices without shock], reshape the cube to
+    (-1, number of options) to get a (scenario, option) matrix
+    """
+    book = options if isinstance(options, OptionBook) else OptionBook.from_options(options)
+    columns = book_columns(book, sigma, size_steps)
+    spot_shocks = np.asarray(spot_shocks, dtype=float)
+    vol_shocks = np.asarray(vol_shocks, dtype=float)
+    n_paths += n_paths % 2
+    base = scenario_chunk(columns, [0.0], [0.0], rf, size_steps, engine, n_paths, seed)[0, 0]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("The number of workers should be at least 1")
+    if workers == 1 or len(spot_shocks) < 2 or len(spot_shocks) * len(vol_shocks) * len(book) < min_parallel:
+        prices = scenario_chunk(columns, spot_shocks, vol_shocks, rf, size_steps, engine, n_paths, seed)
+    else:
+        chunks = np.array_split(spot_shocks, min(workers, len(spot_shocks)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            prices = np.concatenate(list(executor.map(
+                scenario_chunk, [columns] * len(chunks), chunks, [vol_shocks] * len(chunks), [rf] * len(chunks),
+                [size_steps] * len(chunks), [engine] * len(chunks), [n_paths] * len(chunks), [seed] * len(chunks))))
+    return [prices - base, base]
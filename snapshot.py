@@ -0,0 +1,97 @@
+import json
+import os
+import numpy as np
+from classes import *
+from book import OptionBook
+
+# Version of the layout of the snapshot directories
+SNAPSHOT_FORMAT = 1
+BOOK_COLUMNS = ["types", "strikes", "barriers", "days", "asset_indexes"]
+
+
+def save_snapshot(path, assets, options):
+    """
+    Saves assets and options in a directory of .npy files: one file per column of the options, which reference their
+    asset by index, and the price histories of every asset concatenated in two files with the offset of each asset
+    The manifest holding the names of the assets is written last, a directory without manifest is not a snapshot
+    :param path: Directory of the snapshot, created if needed
+    :param assets: List of assets, the assets of the options missing from it are added after them
+    :param options: List of options or OptionBook
+    :return: The OptionBook saved
+    """
+    book = OptionBook(capacity=max(len(options), 1))
+    for asset in assets:
+        book.add_asset(asset)
+    if isinstance(options, OptionBook):
+        indexes = np.array([book.add_asset(asset) for asset in options.assets], dtype=np.int32)
+        columns = [options.types, options.strikes, options.barriers, options.days, indexes[options.asset_indexes]]
+    else:
+        for option in options:
+            book.add_option(option)
+        columns = [book.types, book.strikes, book.barriers, book.days, book.asset_indexes]
+    os.makedirs(path, exist_ok=True)
+    # The directory stops being a snapshot until the new manifest is written, so an interrupted save can not be loaded
+    manifest_file = os.path.join(path, "manifest.json")
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    def save(name, array):
+        # The arrays may be memory mapped on the files of a snapshot loaded lazily from this directory: each file is
+        # written next to the old one and replaces it once complete, the old mapping stays valid until then
+        temporary = os.path.join(path, name + ".tmp.npy")
+        np.save(temporary, array)
+        os.replace(temporary, os.path.join(path, name + ".npy"))
+
+    for name, column in zip(BOOK_COLUMNS, columns):
+        save(name, column)
+
+    histories = [asset.price_history for asset in book.assets]
+    offsets = np.zeros(len(histories) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(history) for history in histories])
+    save("history_offsets", offsets)
+    save("history_timestamps",
+         np.concatenate([history.timestamps.view(np.int64) for history in histories] + [np.empty(0, np.int64)]))
+    save("history_prices", np.concatenate([history.prices for history in histories] + [np.empty(0)]))
+    save("history_extrema", np.array([[history.max, history.min] for history in histories], dtype=float).reshape(-1, 2))
+
+    manifest = {"format": SNAPSHOT_FORMAT, "assets": [{"name": asset.name, "initial_price": asset.initial_price}
+                                                      for asset in book.assets]}
+    temporary = manifest_file + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temporary, manifest_file)
+    return book
+
+
+def load_snapshot(path, lazy=True):
+    """
+    Restores the assets and options saved by save_snapshot
+    With lazy=True every file is memory mapped: loading does not read the options nor the prices, only the pages that
+    are used are read from the disk. The extrema of the histories are kept in the snapshot so Mt and mt do not read
+    the prices. A history is copied in memory the first time a price is appended to it
+    :param path: Directory of the snapshot
+    :param lazy: If False the files are read at once
+    :return: [list of assets, OptionBook], OptionBook.to_options gives the Option objects
+    """
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Unknown snapshot format {}".format(manifest.get("format")))
+    mmap_mode = "r" if lazy else None
+
+    def load(name):
+        return np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+
+    offsets = load("history_offsets")
+    timestamps = load("history_timestamps")
+    prices = load("history_prices")
+    extrema = load("history_extrema")
+    assets = []
+    for index, entry in enumerate(manifest["assets"]):
+        asset = Asset(name=entry["name"], initial_price=entry["initial_price"])
+        start, end = int(offsets[index]), int(offsets[index + 1])
+        if end > start:
+            asset.attach_history(PriceHistory(timestamps=timestamps[start:end], prices=prices[start:end],
+                                              max=float(extrema[index, 0]), min=float(extrema[index, 1])))
+        assets.append(asset)
+    return [assets, OptionBook.from_columns(assets, *[load(name) for name in BOOK_COLUMNS])]
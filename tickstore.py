@@ -0,0 +1,117 @@
+import os
+import numpy as np
+from classes import *
+
+
+class MappedPriceHistory(PriceHistory):
+    def __init__(self, *args, **kwargs):
+        """
+        Price history stored in memory mapped files, one file for the timestamps and one for the prices
+        The files grow by doubling like the arrays of PriceHistory and can be bigger than the memory, only the pages
+        that are read are loaded. A small header file holds the number of prices and their extrema so that opening a
+        history and reading Mt / mt is O(1)
+        :param args:
+        :param kwargs: path: directory of the history, created if needed; capacity: initial number of prices the files
+        can hold
+        """
+        path = kwargs.get("path", None)
+        capacity = kwargs.get("capacity", 1024)
+        if not isinstance(path, str) or not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError("The path should be a string and the capacity a positive integer")
+        os.makedirs(path, exist_ok=True)
+        self.__path = path
+
+        # Header: number of prices, maximum, minimum
+        header_file = os.path.join(path, "header.bin")
+        if not os.path.exists(header_file):
+            np.array([0, np.nan, np.nan]).tofile(header_file)
+        self.__header = np.memmap(header_file, dtype=np.float64, mode="r+", shape=(3,))
+        size = int(self.__header[0])
+        capacity = max(capacity, size, os.path.getsize(self.__file("prices")) // 8 if os.path.exists(
+            self.__file("prices")) else 0)
+        timestamps, prices = self.__map(capacity)
+        extrema = {} if size == 0 else {"max": float(self.__header[1]), "min": float(self.__header[2])}
+        super().__init__(timestamps=timestamps, prices=prices, size=size, **extrema)
+
+    def __file(self, column):
+        return os.path.join(self.__path, column + ".bin")
+
+    def __map(self, capacity):
+        # Growing the files is done by truncate, the data already written is neither read nor copied
+        columns = []
+        for column, dtype in [("timestamps", np.int64), ("prices", np.float64)]:
+            with open(self.__file(column), "ab") as f:
+                if f.tell() < capacity * 8:
+                    f.truncate(capacity * 8)
+            columns.append(np.memmap(self.__file(column), dtype=dtype, mode="r+", shape=(capacity,)))
+        self.__columns = columns
+        return columns
+
+    @property
+    def path(self):
+        return self.__path
+
+    def _allocate(self, capacity):
+        return self.__map(capacity)
+
+    def _commit(self):
+        self.__header[0] = len(self)
+        self.__header[1] = self.max
+        self.__header[2] = self.min
+
+    def flush(self):
+        """
+        Writes the modified pages on the disk
+        :return:
+        """
+        for column in self.__columns:
+            column.flush()
+        self.__header.flush()
+
+
+class TickStore(object):
+    def __init__(self, *args, **kwargs):
+        """
+        Directory holding the price histories of several assets, one sub directory per asset
+        :param args:
+        :param kwargs: path: the directory of the store, created if needed
+        """
+        path = kwargs.get("path", None)
+        if isinstance(path, str):
+            os.makedirs(path, exist_ok=True)
+            self.__path = path
+        else:
+            raise ValueError("The path of the store should be a string")
+
+    @property
+    def path(self):
+        return self.__path
+
+    def names(self):
+        """
+        :return: The names of the assets having a history in the store
+        """
+        return sorted(name for name in os.listdir(self.__path) if os.path.isdir(os.path.join(self.__path, name)))
+
+    def open(self, name, capacity=1024):
+        """
+        Opens the history of an asset, it is created if it does not exist
+        :param name: Name of the asset
+        :param capacity: Initial number of prices the files can hold
+        :return: A MappedPriceHistory
+        """
+        if not name or os.sep in name or name in (".", ".."):
+            raise ValueError("The name of the asset can not be used as a directory name")
+        return MappedPriceHistory(path=os.path.join(self.__path, name), capacity=capacity)
+
+    def attach(self, asset, capacity=1024):
+        """
+        Stores the price history of an asset in the store, under the name of the asset
+        If the store already holds prices for this name the asset takes them, otherwise its prices are copied
+        :param asset: The asset
+        :param capacity: Initial number of prices the files can hold
+        :return: The MappedPriceHistory now used by the asset
+        """
+        history = self.open(asset.name, capacity=capacity)
+        asset.attach_history(history)
+        return history
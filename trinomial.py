@@ -0,0 +1,175 @@
+import math
+import numpy as np
+from classes import *
+import analytic
+from analytic import BARRIER_TYPES
+
+
+def trinomial_parameters(rf, sigma, size_steps, stretch):
+    """
+    Computes the parameters of a trinomial tree in the logarithm of the price (Ritchken)
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param size_steps: Size of the steps in years
+    :param stretch: Ratio between the space step and sigma * sqrt(size_steps), at least 1
+    :return: (h, pu, pm, pd) the space step and the risk neutral probabilities of an up, middle and down move
+    """
+    h = stretch * sigma * math.sqrt(size_steps)
+    drift = (rf - 0.5 * sigma * sigma) * size_steps / h
+    pu = 0.5 / (stretch * stretch) + 0.5 * drift
+    pd = 0.5 / (stretch * stretch) - 0.5 * drift
+    pm = 1 - 1 / (stretch * stretch)
+    if min(pu, pm, pd) < 0:
+        raise ValueError("A probability of the trinomial tree is negative, the step size is too large")
+    return h, pu, pm, pd
+
+
+def barrier_grid(spot, barrier, sigma, T, N, min_layers=2):
+    """
+    Chooses the steps of a trinomial tree so that a layer of nodes lies exactly on the barrier
+    The space step is stretched so that the barrier is a whole number of steps away from the spot. When the spot is
+    so close to the barrier that fewer than min_layers layers separate them, the mesh is refined locally instead: the
+    grid keeps its layer on the barrier but is no longer centered on the spot, the tree starts one step before and the
+    price is interpolated between the nodes around the spot, so N does not grow however close the spot is
+    :param spot: Price of the underlying asset
+    :param barrier: Barrier price, different from the spot
+    :param sigma: Volatility
+    :param T: Time to maturity in years
+    :param N: Number of steps
+    :param min_layers: Minimum number of space steps between the spot and the barrier of a tree centered on the spot
+    :return: (size_steps, layers, stretch, offset) the size of the time steps, the number of space steps between the
+    center of the tree and the barrier, the stretch of the space step and the position of the spot from the center in
+    space steps, 0 when the tree is centered on the spot
+    """
+    distance = abs(math.log(barrier / spot))
+    size_steps = T / N
+    layers = int(distance / (sigma * math.sqrt(size_steps)))
+    if layers >= min_layers:
+        return size_steps, layers, distance / (layers * sigma * math.sqrt(size_steps)), 0.0
+    # A stretch of sqrt(3 / 2) gives a probability of 1 / 3 to each move, the center is the node closest to the spot
+    # that is not on the barrier
+    stretch = math.sqrt(1.5)
+    h = stretch * sigma * math.sqrt(size_steps)
+    layers = max(1, int(round(distance / h)))
+    return size_steps, layers, stretch, distance / h - layers
+
+
+def interpolate(values, offset):
+    """
+    Quadratic interpolation between three nodes one space step apart
+    :param values: Array (..., 3) of the values at the nodes -1, 0 and 1
+    :param offset: Position at which the value is interpolated, in space steps from the node 0
+    :return: The interpolated values
+    """
+    return (values[..., 0] * offset * (offset - 1) / 2 + values[..., 1] * (1 - offset * offset)
+            + values[..., 2] * offset * (offset + 1) / 2)
+
+
+def trinomial_price(spot, strike, T, rf, sigma, N, is_put=False, barrier=None, is_down=False, is_in=False,
+                    min_layers=2):
+    """
+    Prices a european call or put, with or without a barrier monitored continuously, on a trinomial tree
+    The knock out options are rolled back with the value 0 on the layer of the barrier and beyond. The knock in options
+    are priced by in-out parity: the vanilla option minus the knock out option, both rolled back in the rows of the same
+    buffers
+    :param spot: Price of the underlying asset
+    :param strike: Strike price
+    :param T: Time to maturity in years
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps in the tree
+    :param is_put: True for puts, False for calls
+    :param barrier: Barrier price, None for a vanilla option
+    :param is_down: True for down barriers, False for up barriers
+    :param is_in: True for knock in options, False for knock out options
+    :param min_layers: Minimum number of space steps between the spot and the barrier, see barrier_grid
+    :return: The price of the option
+    """
+    if N < 1:
+        raise ValueError("The number of steps should be at least 1")
+    offset = 0.0
+    if barrier is None:
+        size_steps = T / N
+        h, pu, pm, pd = trinomial_parameters(rf, sigma, size_steps, math.sqrt(1.5))
+        layers = None
+    else:
+        if spot == barrier:
+            # The barrier is hit right away
+            return trinomial_price(spot, strike, T, rf, sigma, N, is_put=is_put) if is_in else 0.0
+        if (spot > barrier) != is_down:
+            raise ValueError("The barrier has already been crossed")
+        size_steps, layers, stretch, offset = barrier_grid(spot, barrier, sigma, T, N, min_layers=min_layers)
+        h, pu, pm, pd = trinomial_parameters(rf, sigma, size_steps, stretch)
+    discount = math.exp(-rf * size_steps)
+    up, middle, down = discount * pu, discount * pm, discount * pd
+    # Position of the spot in the log prices, from the center of the tree
+    shift = offset if is_down else -offset
+    # A tree that is not centered on the spot starts one step before, so that its column at time 0 holds three nodes
+    first = 1 if offset else 0
+    N += first
+
+    # Node j of a column is at index N + j, the barrier is at index N - layers or N + layers. The last step is
+    # replaced by the closed formulas over one step, which removes the error due to the kink of the payoff
+    rows = 2 if barrier is not None and is_in else 1
+    prices = np.exp(math.log(spot) + h * (np.arange(-N, N + 1) - shift))
+    values = np.empty((rows, 2 * N + 1))
+    scratch = np.empty((rows, 2 * N + 1))
+    knocked = None
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        if barrier is None or is_in:
+            values[-1] = analytic.black_scholes(prices, strike, size_steps, rf, sigma, is_put)
+        if barrier is not None:
+            knocked = slice(0, max(N - layers + 1, 0)) if is_down else slice(N + layers, 2 * N + 1)
+            values[0] = analytic.barrier_price(prices, strike, barrier, size_steps, rf, sigma, is_put, is_down,
+                                               False)
+            values[0, knocked] = 0
+
+    for i in range(N - 1, first, -1):
+        # The column i - 1 holds the nodes N - i + 1 to N + i - 1
+        low, high = N - i + 1, N + i
+        current = scratch[:, low:high]
+        np.multiply(values[:, low + 1:high + 1], up, out=current)
+        current += middle * values[:, low:high]
+        current += down * values[:, low - 1:high - 1]
+        values[:, low:high] = current
+        if knocked is not None:
+            values[0, knocked] = 0
+    if first:
+        # The column at time 0 holds the nodes N - 1 to N + 1
+        value = interpolate(values[:, N - 1:N + 2], shift)
+    else:
+        value = values[:, N]
+    if rows == 2:
+        return float(value[1] - value[0])
+    return float(value[0])
+
+
+def trinomial_barrier_price(option, rf, sigma, N, size_steps, min_layers=2):
+    """
+    Prices a call, a put or a barrier option on a trinomial tree whose nodes are aligned on the barrier
+    The price history of the asset is taken into account: a knocked in option is priced as a call or a put and a
+    knocked out option is worth 0
+    :param option: The option we want to price
+    :param rf: Risk-free interest rate
+    :param sigma: Volatility
+    :param N: Number of steps in the tree
+    :param size_steps: Size of the steps in years
+    :param min_layers: Minimum number of space steps between the spot and the barrier, see barrier_grid
+    :return: The price of the option
+    """
+    if isinstance(option, (LoopbackCall, LoopbackPut)) or not isinstance(option, (CallOption, PutOption)):
+        raise ValueError("The option should be a call, a put or a barrier option")
+    spot = option.asset.actual_price
+    T = N * size_steps
+    is_put = isinstance(option, PutOption)
+    if type(option) not in BARRIER_TYPES:
+        return trinomial_price(spot, option.strike, T, rf, sigma, N, is_put=is_put)
+    is_in, is_down = BARRIER_TYPES[type(option)]
+    if option.active != is_in:
+        # Alive knock out option or knock in option not knocked in yet
+        return trinomial_price(spot, option.strike, T, rf, sigma, N, is_put=is_put, barrier=option.barrier,
+                               is_down=is_down, is_in=is_in, min_layers=min_layers)
+    if is_in:
+        # Knocked in, this is a call or a put now
+        return trinomial_price(spot, option.strike, T, rf, sigma, N, is_put=is_put)
+    return 0.0